@@ -0,0 +1,291 @@
+# Benchmarks for the pyproj4de extract/transform/load hot paths.
+#
+# Run from the repo root:
+#   python scripts/benchmark.py                      # run and print results
+#   python scripts/benchmark.py --save               # store as the baseline
+#   python scripts/benchmark.py --compare            # fail on regressions
+#   python scripts/benchmark.py --pages saved.html   # HTML table extraction
+#
+# Synthetic data is generated with the standard library only, and each case
+# runs in a fresh interpreter. Peak RSS is reset before each stage on Linux,
+# so it is measured per stage there (and left out elsewhere). Nothing here
+# needs network access.
+
+# This allows pyproj4de dependency to be run interactively or from terminal
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+import os
+import sys
+import csv
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+
+baseline_file = "data/benchmarks/baseline.json"
+
+# name: (rows per file, numeric columns, files per format, xml nesting depth)
+cases = {
+    'small': (10_000, 4, 2, 0),
+    'wide': (10_000, 64, 2, 0),
+    'many_files': (1_000, 4, 50, 0),
+    'nested_xml': (10_000, 4, 2, 3),
+    'large': (250_000, 8, 2, 0),
+}
+
+# name: table rows in a synthetic HTML page
+html_cases = {
+    'html': 50_000,
+}
+
+# --- Synthetic data ---
+
+def generate_data(dir_path, rows, cols, files, nesting = 0, seed = 42):
+    """Write `files` CSV, NDJSON and XML files of `rows` x (`cols` + 1)."""
+    rng = random.Random(seed)
+    names = ['id'] + [f'c{i}' for i in range(cols)]
+
+    def records():
+        for i in range(rows):
+            yield [str(i)] + [f"{rng.uniform(0, 1000):.4f}" for _ in range(cols)]
+
+    for n in range(files):
+        with open(os.path.join(dir_path, f"part{n}.csv"), "w", newline = "") as f:
+            writer = csv.writer(f)
+            writer.writerow(names)
+            writer.writerows(records())
+
+        with open(os.path.join(dir_path, f"part{n}.json"), "w") as f:
+            for record in records():
+                row = {'id': record[0]}
+                row.update({k: float(v) for k, v in zip(names[1:], record[1:])})
+                f.write(json.dumps(row) + "\n")
+
+        # Optional nested <meta> subtree inside the id field, which the
+        # extractors skip (the field's own text is still the id)
+        meta = "<meta>" * nesting + "x" + "</meta>" * nesting if nesting else ""
+        with open(os.path.join(dir_path, f"part{n}.xml"), "w") as f:
+            f.write("<data>")
+            for record in records():
+                fields = "".join(
+                    f"<{k}>{v}{meta if k == 'id' else ''}</{k}>"
+                    for k, v in zip(names, record)
+                )
+                f.write(f"<row>{fields}</row>")
+            f.write("</data>")
+
+    return names
+
+def generate_html(file, rows):
+    """Write a Wikipedia-like page whose second <tbody> holds `rows` rows."""
+    with open(file, "w") as f:
+        f.write("<html><body><p>" + "lorem ipsum " * 5000 + "</p>")
+        f.write("<table><tbody><tr><td>navigation</td></tr></tbody></table>")
+        f.write("<table><tbody><tr class='static-row-header'>"
+                "<th>Rank</th><th>Name</th><th>Value</th></tr>")
+        for i in range(rows):
+            f.write(f"<tr><td>{i}</td><td><a href='/wiki/{i}'>Name &amp; {i}</a>"
+                    f"<sup>[{i % 7}]</sup></td><td> {i * 1.5:,.1f} </td></tr>")
+        f.write("</tbody></table></body></html>")
+
+def bs4_html_table(html, index, headers):
+    """The BeautifulSoup implementation the scrapers used before."""
+    import polars as pl
+    from bs4 import BeautifulSoup
+
+    table = BeautifulSoup(html, 'html.parser').find_all('tbody')[index]
+    rows = []
+    for tr in table.find_all('tr'):
+        if 'static-row-header' in tr.get('class', []):
+            continue
+        row = [td.text.strip() for td in tr.find_all(['td'])]
+        if row and len(row) == len(headers):
+            rows.append(row)
+    return pl.DataFrame(rows, schema = headers, orient = "row")
+
+# --- Measurement (runs in a child interpreter) ---
+
+def run_case(dir_path, cols):
+    """Time each stage on an already generated directory."""
+    import polars as pl
+    from src import pyproj4de as de
+
+    names = ['id'] + [f'c{i}' for i in range(cols)]
+    schema = {col: pl.Float64 for col in names[1:]}
+    units = {col: ('pound', 'kilogram') for col in names[1:]}
+    de.unit_factors('pound', 'kilogram')  # keep registry setup out of timings
+
+    results = {}
+
+    def stage(name, func):
+        rss = de._reset_peak_rss()
+        start, cpu = time.perf_counter(), time.process_time()
+        out = func()
+        if isinstance(out, pl.LazyFrame):
+            # engine = 'streaming' on polars 1.23+, streaming = True before
+            out = de._collect_streaming(out)
+        wall = time.perf_counter() - start
+        rows = out.height if isinstance(out, pl.DataFrame) else n_rows
+        results[name] = {
+            'wall_s': round(wall, 4),
+            'cpu_s': round(time.process_time() - cpu, 4),
+            'rows_per_s': round(rows / wall) if wall else None,
+            'peak_rss_mb': de._stage_peak_rss_mb(rss)
+        }
+        return out
+
+    for fmt, reader in [
+        ('csv', de.extract_csv),
+        ('json', de.extract_json),
+        ('xml', de.extract_xml),
+        ('xml_stream', de.extract_xml_stream)
+    ]:
+        ext = 'xml' if fmt.startswith('xml') else fmt
+        stage(f'extract_{fmt}', lambda: reader(os.path.join(dir_path, f"part0.{ext}")))
+
+    data = stage('extract_data', lambda: de.extract_data(dir_path))
+    n_rows = data.height
+    stage('extract_data_lazy', lambda: de.extract_data(dir_path, lazy = True))
+    stage('extract_data_typed', lambda: de.extract_data(dir_path, schema = schema))
+    stage('extract_data_workers', lambda: de.extract_data(dir_path, workers = 4))
+    typed = stage('transform_type', lambda: de.transform_type(data, schema = schema))
+    converted = stage('transform_unit', lambda: de.transform_unit(typed, conversions = units))
+    with tempfile.TemporaryDirectory() as out_dir:
+        stage('write_data_csv', lambda: de.write_data(os.path.join(out_dir, "out.csv"), converted))
+        stage('write_data_parquet', lambda: de.write_data(os.path.join(out_dir, "out.parquet"), converted))
+
+    return results
+
+def run_html(file, index = 1, headers = ('Rank', 'Name', 'Value')):
+    """Time extract_html_table against the BeautifulSoup implementation."""
+    from src import pyproj4de as de
+
+    with open(file) as f:
+        html = f.read()
+    headers = list(headers) if headers else None
+
+    results = {}
+    outputs = {}
+
+    def stage(name, func):
+        rss = de._reset_peak_rss()
+        start, cpu = time.perf_counter(), time.process_time()
+        outputs[name] = func()
+        wall = time.perf_counter() - start
+        results[name] = {
+            'wall_s': round(wall, 4),
+            'cpu_s': round(time.process_time() - cpu, 4),
+            'rows_per_s': round(outputs[name].height / wall) if wall else None,
+            'peak_rss_mb': de._stage_peak_rss_mb(rss)
+        }
+
+    stage('extract_html_table', lambda: de.extract_html_table(
+        html, index, headers, options = {'cells': ('td',)}
+    ))
+    try:
+        stage('bs4_html_table', lambda: bs4_html_table(
+            html, index, headers or list(outputs['extract_html_table'].columns)
+        ))
+    except ImportError:
+        pass
+    return results
+
+# --- Driver ---
+
+def run_all(selected, pages = ()):
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cases': {}
+    }
+    def worker(*args):
+        # Fresh interpreter per case so cases don't share caches or memory
+        out = subprocess.run(
+            [sys.executable, __file__, *args],
+            check = True,
+            capture_output = True,
+            text = True
+        )
+        return json.loads(out.stdout)
+
+    for name in selected:
+        with tempfile.TemporaryDirectory() as dir_path:
+            if name in html_cases:
+                page = os.path.join(dir_path, "page.html")
+                generate_html(page, html_cases[name])
+                report['cases'][name] = worker('--worker-html', page, '1')
+            else:
+                rows, cols, files, nesting = cases[name]
+                generate_data(dir_path, rows, cols, files, nesting)
+                report['cases'][name] = worker('--worker', dir_path, str(cols))
+        print_case(name, report['cases'][name])
+
+    # Saved pages: first tbody, header detected from the page
+    for page in pages:
+        name = os.path.basename(page)
+        report['cases'][name] = worker('--worker-html', page, '0', '--no-headers')
+        print_case(name, report['cases'][name])
+    return report
+
+def print_case(name, stages):
+    print(f"\n{name}")
+    print(f"  {'stage':<22}{'wall s':>10}{'rows/s':>14}{'peak MB':>10}")
+    for stage, m in stages.items():
+        peak = f"{m['peak_rss_mb']:.1f}" if m.get('peak_rss_mb') is not None else '-'
+        print(f"  {stage:<22}{m['wall_s']:>10.3f}{m['rows_per_s'] or 0:>14,}{peak:>10}")
+
+def compare(report, baseline, threshold):
+    """Return stages whose throughput dropped more than `threshold`."""
+    regressions = []
+    for name, stages in report['cases'].items():
+        for stage, m in stages.items():
+            base = baseline.get('cases', {}).get(name, {}).get(stage)
+            if not base or not base['rows_per_s'] or not m['rows_per_s']:
+                continue
+            change = m['rows_per_s'] / base['rows_per_s'] - 1
+            if change < -threshold:
+                regressions.append((name, stage, base['rows_per_s'], m['rows_per_s'], change))
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--cases', nargs = '+', choices = list(cases) + list(html_cases), default = ['small', 'wide', 'many_files', 'nested_xml', 'html'])
+    parser.add_argument('--pages', nargs = '+', default = [], help = "saved HTML pages to benchmark table extraction on")
+    parser.add_argument('--baseline', default = baseline_file)
+    parser.add_argument('--save', action = 'store_true', help = "store results as the baseline")
+    parser.add_argument('--compare', action = 'store_true', help = "compare against the baseline")
+    parser.add_argument('--threshold', type = float, default = 0.2, help = "allowed throughput drop (fraction)")
+    parser.add_argument('--worker', nargs = 2, metavar = ('DIR', 'COLS'), help = argparse.SUPPRESS)
+    parser.add_argument('--worker-html', nargs = 2, metavar = ('PAGE', 'INDEX'), help = argparse.SUPPRESS)
+    parser.add_argument('--no-headers', action = 'store_true', help = argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_case(args.worker[0], int(args.worker[1]))))
+        sys.exit(0)
+    if args.worker_html:
+        headers = None if args.no_headers else ('Rank', 'Name', 'Value')
+        print(json.dumps(run_html(args.worker_html[0], int(args.worker_html[1]), headers)))
+        sys.exit(0)
+
+    report = run_all(args.cases, args.pages)
+
+    if args.save:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok = True)
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent = 2)
+        print(f"\nBaseline saved to {args.baseline}")
+
+    if args.compare:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(report, baseline, args.threshold)
+        for name, stage, before, after, change in regressions:
+            print(f"REGRESSION {name}/{stage}: {before:,} -> {after:,} rows/s ({change:+.0%})")
+        sys.exit(1 if regressions else 0)
@@ -5,45 +5,59 @@ if __name__ == "__main__":
     sys.path.append(str(Path(__file__).parent.parent))
 
 import polars as pl
-from datetime import datetime
 
 from src import pyproj4de as de
 
 data_dir = "data/raw/minimal/source"
 data_file = "data/processed/source.csv"
-log_file = "logs/log_file.txt"
+manifest_file = "data/processed/source_manifest.json"
+seen_file = "data/processed/source_seen.parquet"
+log_file = "logs/log_file.jsonl"
 
-def log_progress(message, log_file = log_file):
-    timestamp_format = '%Y-%h-%d-%H:%M:%S' # Year-Monthname-Day-Hour-Minute-Second 
-    now = datetime.now() # get current timestamp 
-    timestamp = now.strftime(timestamp_format) 
-    with open(log_file,"a") as f: 
-        f.write(timestamp + ',' + message + '\n')
-
-log_progress("ETL job started")
-
-log_progress("Extract phase started")
-extracted_data = de.extract_data(data_dir)
-log_progress("Extract phase finished")
-
-log_progress("Transform phase started") 
 type_schema = {
     'height': pl.Float64,
     'weight': pl.Float64
     }
 
-typed_data = de.transform_type(extracted_data, schema = type_schema)
-
 unit_schema = {
     'height': ('inch', 'meter'),
     'weight': ('pound', 'kilogram')
     }
 
-converted_data = de.transform_unit(typed_data, conversions = unit_schema)
-log_progress("Transform phase finished") 
-
-log_progress("Load phase started") 
-de.write_data(data_file, data = converted_data)
-log_progress("Load phase finished") 
-
-log_progress("ETL job finished\n")
\ No newline at end of file
+transform_plan = de.TransformPlan(types = type_schema, units = unit_schema)
+
+logger = de.StageLogger(log_file)
+logger("ETL job started")
+
+manifest = de.load_manifest(manifest_file)
+incremental = len(manifest) > 0 # first run rewrites the output file
+# The same records arrive in csv, json and xml; keep the first copy,
+# including against rows loaded by earlier runs
+dedup = de.DedupIndex(file = seen_file if incremental else None)
+
+with logger.stage("extract") as record:
+    seen = dict(manifest)
+    extracted_data = de.extract_data(
+        data_dir,
+        manifest = manifest,
+        schema = type_schema,
+        dedup = dedup,
+        lazy = True
+        )
+    # Files new or changed since the last run are the ones read
+    record['bytes_read'] = sum(
+        fingerprint['size'] for file, fingerprint in manifest.items()
+        if seen.get(file) != fingerprint
+        )
+
+with logger.stage("transform"):
+    converted_data = transform_plan(extracted_data)
+
+# Extract and transform are lazy; the work happens as the load streams
+with logger.stage("load"):
+    de.write_data(data_file, data = converted_data, append = incremental)
+    de.save_manifest(manifest_file, manifest)
+    dedup.save(seen_file)
+
+logger("ETL job finished")
+logger.close()
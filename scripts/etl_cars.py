@@ -5,13 +5,14 @@ if __name__ == "__main__":
     sys.path.append(str(Path(__file__).parent.parent))
 
 # import polars as pl
-from datetime import datetime
 
 from src import pyproj4de as de
 
 data_dir = "data/raw/minimal/datasource"
 data_file = "data/processed/datasource.csv"
-log_file = "logs/datasource_log_file.txt"
+manifest_file = "data/processed/datasource_manifest.json"
+seen_file = "data/processed/datasource_seen.parquet"
+log_file = "logs/datasource_log_file.jsonl"
 
 type_schema = {
     # 'height': pl.Float64,
@@ -23,26 +24,41 @@ unit_schema = {
     # 'weight': ('pound', 'kilogram')
     }
 
-def log_progress(message, log_file = log_file):
-    timestamp_format = '%Y-%h-%d-%H:%M:%S' # Year-Monthname-Day-Hour-Minute-Second 
-    now = datetime.now() # get current timestamp 
-    timestamp = now.strftime(timestamp_format) 
-    with open(log_file, "a") as f: 
-        f.write(timestamp + ',' + message + '\n')
+def load(data):
+    de.write_data(data_file, data = data, append = incremental)
+    de.save_manifest(manifest_file, manifest)
+    dedup.save(seen_file)
 
-log_progress("ETL job started")
+logger = de.StageLogger(log_file)
+logger("ETL job started")
 
-log_progress("Extract phase started")
-extracted_data = de.extract_data(data_dir)
-log_progress("Extract phase finished")
+manifest = de.load_manifest(manifest_file)
+incremental = len(manifest) > 0 # first run rewrites the output file
+# A changed file is re-read in full; drop the rows earlier runs loaded
+dedup = de.DedupIndex(file = seen_file if incremental else None)
 
-log_progress("Transform phase started") 
-typed_data = de.transform_type(extracted_data, schema = type_schema)
-converted_data = de.transform_unit(typed_data, conversions = unit_schema)
-log_progress("Transform phase finished") 
+stages = {
+    'extract': {
+        'func': de.extract_data,
+        'kwargs': {'dir_path': data_dir, 'manifest': manifest, 'dedup': dedup}
+        },
+    'transform_type': {
+        'func': de.transform_type,
+        'inputs': ['extract'],
+        'kwargs': {'schema': type_schema}
+        },
+    'transform_unit': {
+        'func': de.transform_unit,
+        'inputs': ['transform_type'],
+        'kwargs': {'conversions': unit_schema}
+        },
+    'load': {
+        'func': load,
+        'inputs': ['transform_unit']
+        }
+    }
 
-log_progress("Load phase started") 
-de.write_data(data_file, data = converted_data)
-log_progress("Load phase finished") 
+de.run_pipeline(stages, log = logger)
 
-log_progress("ETL job finished\n")
\ No newline at end of file
+logger("ETL job finished")
+logger.close()
\ No newline at end of file
@@ -5,18 +5,18 @@ if __name__ == "__main__":
     sys.path.append(str(Path(__file__).parent.parent))
 
 from datetime import datetime
-import requests
 import polars as pl
-from bs4 import BeautifulSoup, Tag
-import ibis
-from ibis.backends.sqlite import Backend
+
+from src import pyproj4de as de
 
 data_url = 'https://web.archive.org/web/20230902185326/' \
     + 'https://en.wikipedia.org/wiki/List_of_countries_by_GDP_(nominal)'
 tbl_cols = ['Country', 'GDP']
 log_file = "logs/etl_project_log.txt"
+cache_dir = "data/raw/cache"
 csv_file = "data/processed/Countries_by_GDP.csv"
 db_file = "data/processed/World_Economies.db"
+warehouse_file = "data/processed/World_Economies.duckdb"
 tbl_name = "Countries_by_GDP"
 
 tbl_headers = [
@@ -34,37 +34,16 @@ sql_query = """
     "t0"."GDP" > 100
 """
 
-def html_table_to_polars(table: Tag, headers: list) -> pl.DataFrame:
-    # Extract rows
-    rows = []
-    for tr in table.find_all('tr'):
-        # Skip header rows
-        if 'static-row-header' in tr.get('class', []):
-            continue
-
-        row = []
-        for td in tr.find_all(['td']):
-            # Get text content and clean it
-            content = td.text.strip()
-            row.append(content)
-    
-        if row and len(row) == len(headers):  # Only add rows that match header length
-            rows.append(row)
-    
-    # Create Polars DataFrame
-    df = pl.DataFrame(rows, schema = headers, orient = "row")
-    return df
-
-def url_to_html_table(url: str, index: int) -> Tag:
-    html_page = requests.get(url).text
-    data = BeautifulSoup(html_page, 'html.parser')
-    tables = data.find_all('tbody')
-    table = tables[index]
-    return table
-
 def extract(url: str, index: int, headers: list) -> pl.DataFrame :
-    table = url_to_html_table(url, index)
-    df = html_table_to_polars(table, headers)
+    html_page = de.fetch_url(url, cache_dir = cache_dir)
+    df = de.extract_html_table(
+        html_page,
+        index,
+        headers,
+        # Countries missing an estimate have a single colspan "—" cell;
+        # don't expand spans, so those rows are dropped for the wrong length
+        options = {'cells': ('td',), 'spans': False}
+        )
     return df
 
 def transform(df: pl.DataFrame) -> pl.DataFrame:
@@ -93,15 +72,22 @@ def load_to_csv(df: pl.DataFrame, csv_path) -> None:
 
 def load_to_db(
     df: pl.DataFrame,
-    sql_connection: ibis.backends.sqlite.Backend,
-    table_name: str) -> None:
-    sql_connection.create_table(table_name, df)
+    db_path: str,
+    table_name: str) -> dict:
+    # Only changed rows are written; returns the change counts
+    return de.merge_sqlite(db_path, table_name, df, key = ["Country"])
+
+def load_to_warehouse(
+    df: pl.DataFrame,
+    warehouse_path: str,
+    table_name: str) -> int:
+    return de.load_duckdb(warehouse_path, table_name, df, mode = "replace")
 
 def run_query(
     query_statement: str,
-    sql_connection: Backend) -> None:    
-    out = sql_connection.sql(query_statement)
-    print(out.execute())
+    warehouse_path: str) -> None:
+    out = de.query_duckdb(warehouse_path, query_statement)
+    print(out)
 
 def log_progress(message, log_file = log_file):
     timestamp_format = '%Y-%h-%d-%H:%M:%S' # Year-Monthname-Day-Hour-Minute-Second 
@@ -125,19 +111,21 @@ load_to_csv(data_transformed, csv_file)
 log_progress("Done loading to csv")
 
 log_progress("Loading data to sqlite database")
-conn = ibis.sqlite.connect(db_file)
-
-load_to_db(
+changes = load_to_db(
     df = data_transformed,
-    sql_connection = conn,
+    db_path = db_file,
     table_name = tbl_name
     )
-log_progress("Done loading to sqlite database")
+log_progress(
+    "Done loading to sqlite database ({inserted} inserted, {updated} updated, "
+    "{deleted} deleted, {unchanged} unchanged)".format(**changes)
+    )
+load_to_warehouse(data_transformed, warehouse_file, tbl_name)
+log_progress("Done loading to DuckDB warehouse")
 log_progress("Load phase finished")
 
 log_progress("Running query on databse")
-run_query(sql_query, conn)
+run_query(sql_query, warehouse_file)
 log_progress("Finished runnning query on databse")
 
-conn.disconnect()
 log_progress("ETL job finished\n")
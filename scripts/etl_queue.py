@@ -0,0 +1,62 @@
+# Distributed version of etl.py over many landing directories.
+#
+# Run from the repo root, with the queue and shard directory on a filesystem
+# every machine can reach:
+#   python scripts/etl_queue.py enqueue data/raw/landing/*   # coordinator
+#   python scripts/etl_queue.py work --workers 4              # on each machine
+#   python scripts/etl_queue.py merge                         # once drained
+
+# This allows pyproj4de dependency to be run interactively or from terminal
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+
+import argparse
+import polars as pl
+
+from src import pyproj4de as de
+
+queue_file = "data/processed/queue.db"
+shard_dir = "data/processed/shards"
+data_file = "data/processed/source.parquet"
+
+type_schema = {
+    'height': pl.Float64,
+    'weight': pl.Float64
+    }
+
+unit_schema = {
+    'height': ('inch', 'meter'),
+    'weight': ('pound', 'kilogram')
+    }
+
+transform_plan = de.TransformPlan(types = type_schema, units = unit_schema)
+
+def process(file):
+    # Module level, so spawned worker processes can unpickle it
+    return transform_plan(de.extract_file(file, schema = type_schema))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    commands = parser.add_subparsers(dest = 'command', required = True)
+    enqueue = commands.add_parser('enqueue', help = "add landing directories to the queue")
+    enqueue.add_argument('dirs', nargs = '+')
+    work = commands.add_parser('work', help = "process jobs until the queue is drained")
+    work.add_argument('--workers', type = int, default = 1)
+    work.add_argument('--lease', type = float, default = 300)
+    commands.add_parser('merge', help = "merge shard outputs into the final file")
+    commands.add_parser('status', help = "print job counts")
+    args = parser.parse_args()
+
+    if args.command == 'enqueue':
+        print(f"{de.enqueue_files(queue_file, args.dirs)} jobs added")
+    elif args.command == 'work':
+        if args.workers > 1:
+            counts = de.run_workers(queue_file, process, shard_dir, workers = args.workers, lease = args.lease)
+        else:
+            counts = de.run_worker(queue_file, process, shard_dir, lease = args.lease)
+        print(counts)
+    elif args.command == 'merge':
+        de.write_data(data_file, de.merge_shards(queue_file))
+    print(de.queue_status(queue_file))
@@ -1,8 +1,14 @@
-import requests
+# This allows pyproj4de dependency to be run interactively or from terminal
+if __name__ == "__main__":
+    import sys
+    from pathlib import Path
+    sys.path.append(str(Path(__file__).parent.parent))
+
 # import sqlite3
 # import pandas as pd
 import polars as pl
-from bs4 import BeautifulSoup
+
+from src import pyproj4de as de
 
 # Options
 url = 'https://web.archive.org/web/20230902185655/' + \
@@ -10,52 +16,19 @@ url = 'https://web.archive.org/web/20230902185655/' + \
 db_name = 'sqlite:///data/processed/Movies.db'
 table_name = 'Top_50'
 csv_path = 'data/processed/top_50_films.csv'
+cache_dir = 'data/raw/cache'
 
 # Read in data
-html_page = requests.get(url).text
-data = BeautifulSoup(html_page, 'html.parser')
-tables = data.find_all('tbody')
-table = tables[0]
-
-def html_table_to_polars(table):
-    # Extract headers
-    headers = []
-    for th in table.find_all('th'):
-        headers.append(th.text.strip())
-    
-    # If no headers found, use empty strings
-    if not headers:
-        headers = [f'column_{i}' for i in range(len(table.find('tr').find_all(['td', 'th'])))]
-    
-    # Extract rows
-    rows = []
-    for tr in table.find_all('tr'):
-        row = []
-        for td in tr.find_all(['td', 'th']):
-            row.append(td.text.strip())
-        if row:  # Skip empty rows
-            rows.append(row)
-    
-    # Remove header row if it's in the rows data
-    if headers:
-        rows = [row for row in rows if row != headers]
-    
-    # Create Polars DataFrame
-    df = pl.DataFrame(rows, schema = headers, orient = "row")
-    return df
-
-rankings = html_table_to_polars(table)
-
-df = (rankings
-    .select(['Average Rank', 'Film', 'Year'])
-    .with_columns([
-        pl.col('Year')
-            .replace("unranked", None)
-            .cast(pl.Int64),
-        pl.col('Average Rank').cast(pl.Int64)
-    ])
-    .filter(pl.col('Average Rank') <= 50)
+html_page = de.fetch_url(url, cache_dir = cache_dir)
+rankings = de.extract_html_table(html_page, 0)
+
+# "unranked" years become null under the non-strict cast
+transform_plan = de.TransformPlan(
+    types = {'Average Rank': pl.Int64, 'Year': pl.Int64},
+    filter = pl.col('Average Rank') <= 50,
+    select = ['Average Rank', 'Film', 'Year']
 )
+df = transform_plan(rankings)
 
 #Write to csv
 df.write_csv(csv_path)
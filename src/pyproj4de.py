@@ -1,61 +1,263 @@
 import os
+import sys
 import glob
-import pint
+import json
+import hashlib
+import functools
+import sqlite3
+import time
+import warnings
+import threading
+import contextlib
+import atexit
+import tracemalloc
+import uuid
+import io
+import csv
+import gzip
+import mmap
+import tarfile
+import tempfile
+import zipfile
+import urllib.parse
+from concurrent.futures import (
+    ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+)
 import polars as pl
 import xml.etree.ElementTree as ET
+from html.parser import HTMLParser
+from typing import NamedTuple
 
-# Initialize pint registry
-ureg = pint.UnitRegistry()
+@functools.cache
+def get_registry():
+    """Return the shared pint registry, creating it on first use.
+    
+    Importing pint and parsing its definitions is deferred until a unit
+    conversion is actually needed, so runs without unit conversions start
+    fast. If the PYPROJ4DE_PINT_CACHE environment variable is set, parsed
+    definitions are cached on disk in that folder (':auto:' uses pint's
+    default cache location) to speed up later cold starts.
+    """
+    import pint
+
+    cache_folder = os.environ.get('PYPROJ4DE_PINT_CACHE')
+    return pint.UnitRegistry(cache_folder = cache_folder)
+
+def __getattr__(name):
+    # Keep the module-level `ureg` available without building it at import
+    if name == 'ureg':
+        return get_registry()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+class ArchiveMember(NamedTuple):
+    """A file inside a zip or tar archive, usable wherever a path is."""
+    archive: str
+    name: str
+
+    def __str__(self):
+        return f"{self.archive}::{self.name}"
+
+_compressed_suffixes = {'.gz': 'gzip', '.zst': 'zstd'}
+_archive_suffixes = ('.zip', '.tar', '.tar.gz', '.tgz')
+
+def _compression(file):
+    """Return 'gzip', 'zstd' or None from a file name's suffix."""
+    name = file.name if isinstance(file, ArchiveMember) else file
+    return _compressed_suffixes.get(os.path.splitext(name)[1].lower())
+
+def _input_path(file):
+    """The path on disk holding file (the archive for archive members)."""
+    return file.archive if isinstance(file, ArchiveMember) else file
+
+def _zstd_reader(raw):
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError("Reading .zst files requires the zstandard package") from None
+    return zstandard.ZstdDecompressor().stream_reader(raw, closefd = True)
+
+@contextlib.contextmanager
+def open_input(file, mmap_plain = False):
+    """Open a path or ArchiveMember as a binary stream, decompressing on the fly.
+    
+    gzip and zstd files (by suffix) are decompressed as they are read, and
+    zip/tar members are streamed out of their archive, so nothing is
+    unpacked to disk first.
+    
+    Args:
+        file: Path or ArchiveMember
+        mmap_plain: If True, memory-map uncompressed files on disk instead of
+                    reading them through a buffered handle
+    
+    Yields:
+        Binary file-like object
+    """
+    with contextlib.ExitStack() as stack:
+        if isinstance(file, ArchiveMember):
+            if file.archive.lower().endswith('.zip'):
+                archive = stack.enter_context(zipfile.ZipFile(file.archive))
+                raw = stack.enter_context(archive.open(file.name))
+            else:
+                archive = stack.enter_context(tarfile.open(file.archive))
+                raw = stack.enter_context(archive.extractfile(file.name))
+        else:
+            raw = stack.enter_context(open(file, 'rb'))
 
-def extract_csv(file, columns = None, options = None):
+        compression = _compression(file)
+        if compression == 'gzip':
+            yield stack.enter_context(gzip.GzipFile(fileobj = raw))
+        elif compression == 'zstd':
+            yield stack.enter_context(_zstd_reader(raw))
+        elif mmap_plain and not isinstance(file, ArchiveMember) and os.path.getsize(file):
+            yield stack.enter_context(mmap.mmap(raw.fileno(), 0, access = mmap.ACCESS_READ))
+        else:
+            yield raw
+
+def archive_members(file):
+    """List the members of a zip or tar archive as ArchiveMember objects."""
+    if file.lower().endswith('.zip'):
+        with zipfile.ZipFile(file) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    else:
+        with tarfile.open(file) as archive:
+            names = [member.name for member in archive.getmembers() if member.isfile()]
+    return [ArchiveMember(file, name) for name in sorted(names)]
+
+def _input_kind(file):
+    """Return 'csv', 'json' or 'xml' for a (possibly compressed) file name."""
+    name = str(file.name if isinstance(file, ArchiveMember) else file).lower()
+    if _compression(file):
+        name = os.path.splitext(name)[0]
+    ext = os.path.splitext(name)[1]
+    return {'.csv': 'csv', '.json': 'json', '.xml': 'xml'}.get(ext)
+
+@contextlib.contextmanager
+def _polars_source(file):
+    """Yield something polars readers accept for a path or ArchiveMember.
+    
+    Paths are passed through: polars memory-maps plain files and
+    decompresses gzip/zstd itself. Archive members are streamed.
+    """
+    if isinstance(file, ArchiveMember):
+        with open_input(file) as stream:
+            yield stream
+    else:
+        yield file
+
+def _typed_columns(names, schema = None):
+    """Expressions casting schema columns to their dtype and the rest to string."""
+    schema = schema or {}
+    return [
+        pl.col(col).cast(schema[col], strict=False) if col in schema
+        else pl.col(col).cast(pl.String)
+        for col in names
+    ]
+
+def extract_csv(file, columns = None, options = None, schema = None):
     """Extract data from CSV file.
     
     Args:
-        file: Path to CSV file
+        file: Path to CSV file (plain, .gz or .zst), or ArchiveMember
         columns: List of columns to extract
         options: Dict of options for pl.read_csv
+        schema: Optional dict of column names to polars data types. These
+                columns are cast (non-strict) to their dtype as the file is
+                read, so unparseable values become null; all others are read
+                as strings.
     """
     options = options or {}
-    return pl.read_csv(
-        file,
-        columns = columns,
-        infer_schema=False,
-        **options
-    )
+    with _polars_source(file) as source:
+        df = pl.read_csv(
+            source,
+            columns = columns,
+            infer_schema=False,
+            **options
+        )
 
-def extract_json(file, columns = None, options = None):
+    return df.select(_typed_columns(df.columns, schema)) if schema else df
+
+def extract_json(file, columns = None, options = None, schema = None):
     """Extract data from JSON file.
     
     Args:
-        file: Path to JSON file
+        file: Path to JSON file (plain, .gz or .zst), or ArchiveMember
         columns: List of columns to extract (unused but kept for consistency)
         options: Dict of options for pl.read_ndjson
+        schema: Optional dict of column names to polars data types. These
+                columns are cast (non-strict) to their dtype, so unparseable
+                values become null; all others are converted to strings.
     """
     options = options or {}
-    df = pl.read_ndjson(file, **options)
+    with _polars_source(file) as source:
+        df = pl.read_ndjson(source, **options)
     
-    # Convert all columns to string to be consistent
-    df = df.select([
-        pl.col(col).cast(pl.String) for col in df.columns
-    ])
+    # Convert all other columns to string to be consistent
+    df = df.select(_typed_columns(df.columns, schema))
 
     return df
 
-def extract_xml(file, columns = None, options = None):
+def scan_csv(file, columns = None, options = None, schema = None):
+    """Lazily scan data from CSV file.
+    
+    Args:
+        file: Path to CSV file
+        columns: List of columns to extract
+        options: Dict of options for pl.scan_csv
+        schema: Optional dict of column names to polars data types (see
+                extract_csv)
+    """
+    options = options or {}
+    lf = pl.scan_csv(
+        file,
+        infer_schema=False,
+        **options
+    )
+
+    if columns is not None:
+        lf = lf.select(columns)
+    if schema:
+        lf = lf.select(_typed_columns(lf.collect_schema().names(), schema))
+    return lf
+
+def scan_json(file, columns = None, options = None, schema = None):
+    """Lazily scan data from JSON file.
+    
+    Args:
+        file: Path to JSON file
+        columns: List of columns to extract
+        options: Dict of options for pl.scan_ndjson
+        schema: Optional dict of column names to polars data types (see
+                extract_json)
+    """
+    options = options or {}
+    lf = pl.scan_ndjson(file, **options)
+
+    # Convert all other columns to string to be consistent
+    lf = lf.select(_typed_columns(lf.collect_schema().names(), schema))
+
+    return lf.select(columns) if columns is not None else lf
+
+def extract_xml(file, columns = None, options = None, schema = None):
     """Extract data from XML file.
     
     Args:
-        file: Path to XML file
+        file: Path to XML file (plain, .gz or .zst), or ArchiveMember
         columns: List of columns to extract (optional)
         options: Dict with optional keys:
-            - parse: Dict of options for ET.parse
+            - parse: Dict of parser options: encoding, overriding the
+                     document's declared encoding, or parser, an
+                     ET.XMLParser to use instead
             - df: Dict of options for pl.DataFrame
+        schema: Optional dict of column names to polars data types. Values of
+                these columns are cast (non-strict) to their dtype.
     """
     options = options or {}
-    parse_options = options.get('parse', {})
+    parse_options = dict(options.get('parse', {}))
     df_options = options.get('df', {})
+    parser = parse_options.pop('parser', None) or _xml_parser(parse_options)
     
-    tree = ET.parse(file, **parse_options)
+    with open_input(file, mmap_plain = True) as source:
+        tree = ET.parse(source, parser = parser)
     root = tree.getroot()
     
     # Get all records (assuming consistent structure like in the example)
@@ -76,19 +278,418 @@ def extract_xml(file, columns = None, options = None):
             row[column] = element.text if element is not None else None
         data.append(row)
     
-    return pl.DataFrame(data, **df_options)
+    df = pl.DataFrame(data, **df_options)
+    return df.select(_typed_columns(df.columns, schema)) if schema else df
+
+def _xml_parser(parse_options, target = None):
+    """Build an ET.XMLParser from the 'parse' options of the XML readers."""
+    unknown = set(parse_options) - {'encoding'}
+    if unknown:
+        raise ValueError(f"Unsupported XML parse options: {sorted(unknown)}")
+    return ET.XMLParser(target = target, encoding = parse_options.get('encoding'))
+
+def _xml_batch(batch, df_options, schema = None):
+    """Build a DataFrame from per-column value lists, typing schema columns."""
+    df = pl.DataFrame(batch, **df_options)
+    return df.select(_typed_columns(df.columns, schema)) if schema else df
+
+def iter_xml(file, columns = None, options = None, schema = None):
+    """Stream record batches from XML file, parsed in chunks.
+    
+    Records are the immediate children of the root element, as in
+    extract_xml. Finished records are read into per-column lists and
+    removed from the tree after each chunk, so memory stays bounded by
+    batch_size rather than the size of the document.
+    
+    Args:
+        file: Path to XML file (plain, .gz or .zst), or ArchiveMember
+        columns: List of columns to extract (optional, defaults to the tags
+                 of the first record)
+        options: Dict with optional keys:
+            - batch_size: Number of records per batch (default 100_000)
+            - parse: Dict of parser options; only encoding, overriding the
+                     document's declared encoding, is supported
+            - df: Dict of options for pl.DataFrame
+        schema: Optional dict of column names to polars data types. Each batch
+                is cast (non-strict) to these dtypes as it is built.
+    
+    Yields:
+        polars.DataFrame batches of at most batch_size rows
+    """
+    options = options or {}
+    batch_size = options.get('batch_size', 100_000)
+    parse_options = options.get('parse', {})
+    df_options = options.get('df', {})
+
+    for batch in _iter_xml_columns(file, columns, batch_size, parse_options):
+        yield _xml_batch(batch, df_options, schema)
+
+def _iter_xml_columns(file, columns = None, batch_size = 100_000, parse_options = None):
+    """Yield dicts of per-column value lists from XML file (pure Python)."""
+    with open_input(file, mmap_plain = True) as source:
+        yield from _iter_xml_records(source, columns, batch_size, parse_options)
+
+def _iter_xml_records(source, columns, batch_size, parse_options = None):
+    """Yield dicts of per-column value lists from an XML byte stream.
+    
+    The tree is built by the C parser as in extract_xml, with no Python
+    work per element. The builder is given an outer element first, so the
+    document root is reachable while parsing: after each chunk, the root's
+    children but the last (which may still be open) are finished records.
+    They are read into the column lists and removed from the root.
+    """
+    builder = ET.TreeBuilder()
+    top = builder.start('document', {})
+    parser = _xml_parser(parse_options or {}, target = builder)
+    batch = {col: [] for col in columns} if columns is not None else None
+    n_rows = 0
+
+    done = False
+    while not done:
+        chunk = source.read(1 << 16)
+        if chunk:
+            parser.feed(chunk)
+        else:
+            parser.close()
+            done = True
+        if not len(top):
+            continue
+        root = top[0]
+        records = root[:] if done else root[:-1]
+        if not records:
+            continue
+
+        # Get columns from the first record if not provided
+        if batch is None:
+            columns = [child.tag for child in records[0]]
+            batch = {col: [] for col in columns}
+        for record in records:
+            for column in columns:
+                element = record.find(column)
+                batch[column].append(element.text if element is not None else None)
+            n_rows += 1
+            if n_rows >= batch_size:
+                yield batch
+                batch = {col: [] for col in columns}
+                n_rows = 0
+        del root[:len(records)]
+
+    if n_rows:
+        yield batch
+
+def _read_xml_columns(file, columns = None, options = None):
+    """Read a whole XML file into a dict of per-column value lists.
+    
+    Used on process pools: the worker only parses XML, and the parent builds
+    the DataFrame, so no polars data is pickled between processes.
+    """
+    options = options or {}
+    data = None
+    batch_size = options.get('batch_size', 100_000)
+    for batch in _iter_xml_columns(file, columns, batch_size, options.get('parse')):
+        if data is None:
+            data = batch
+        else:
+            for col, values in batch.items():
+                data[col].extend(values)
+    return data
+
+def extract_xml_stream(file, columns = None, options = None, schema = None):
+    """Extract data from XML file in constant memory with iter_xml.
+    
+    Args:
+        file: Path to XML file (plain, .gz or .zst), or ArchiveMember
+        columns: List of columns to extract (optional)
+        options: Dict of options for iter_xml
+        schema: Optional dict of column names to polars data types
+    """
+    batches = list(iter_xml(
+        file,
+        columns = columns,
+        options = options,
+        schema = schema
+    ))
+
+    return pl.concat(batches, rechunk = True) if batches else pl.DataFrame()
+
+def file_fingerprint(file, chunk_size = 1 << 20):
+    """Return the size, modification time and SHA-256 hash of a file.
+    
+    Args:
+        file: Path to file
+        chunk_size: Number of bytes read per hashing step
+    
+    Returns:
+        dict with keys 'size', 'mtime' and 'hash'
+    """
+    stat = os.stat(file)
+    digest = hashlib.sha256()
+    with open(file, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'hash': digest.hexdigest()
+    }
+
+def load_manifest(file):
+    """Load a file manifest written by save_manifest.
+    
+    Args:
+        file: Path to JSON manifest file
+    
+    Returns:
+        dict mapping file paths to fingerprints (empty if file does not exist)
+    """
+    if not os.path.exists(file):
+        return {}
+    with open(file) as f:
+        return json.load(f)
+
+def save_manifest(file, manifest):
+    """Atomically write a file manifest to disk.
+    
+    Args:
+        file: Path to JSON manifest file
+        manifest: dict mapping file paths to fingerprints
+    """
+    tmp = file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent = 2, sort_keys = True)
+    os.replace(tmp, file)
+
+def _manifest_check(file, manifest):
+    """Return a new fingerprint for a new or changed file, or None if seen.
+    
+    Size and mtime are compared first so unchanged files are never hashed;
+    the content hash decides whether a touched file really changed.
+    """
+    key = os.path.abspath(file)
+    seen = manifest.get(key)
+    stat = os.stat(file)
+    if seen and seen['size'] == stat.st_size and seen['mtime'] == stat.st_mtime:
+        return None
+
+    fingerprint = file_fingerprint(file)
+    if seen and seen['hash'] == fingerprint['hash']:
+        # Touched but unchanged: remember the new mtime and skip
+        manifest[key] = fingerprint
+        return None
+    return fingerprint
+
+class DedupIndex:
+    """Set of row hashes seen so far, for dropping duplicate rows
+    incrementally across files and runs.
+    
+    Each row is reduced to a 128-bit hash (two seeded 64-bit polars hashes)
+    of its key columns, or of the whole row. Only the hashes are kept, so
+    deduplication never sorts or holds the concatenated data: each frame is
+    checked against the hashes seen before it and against itself, and the
+    new hashes are added. With a file, the set is loaded on creation and
+    written back by save(), so later runs also skip rows loaded earlier.
+    
+    Rows are compared by value after reading, so dedup typed data (e.g.
+    extract_data with schema) when the same record can arrive as text in
+    one format and as numbers in another.
+    
+    Example:
+        index = DedupIndex(key = ['id'], file = 'data/processed/seen.parquet')
+        df = extract_data('data_directory', schema = schema, dedup = index)
+        write_data('out.csv', df, append = True)
+        index.save()
+    """
+
+    _seeds = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F)
+    _probe = {'key': ['probe'], 'value': [1.0]}
+
+    def __init__(self, key = None, file = None):
+        """
+        Args:
+            key: List of columns identifying a record (optional; default is
+                 the full row, with columns compared by name)
+            file: Parquet file persisting the hashes between runs (optional)
+        """
+        self.key = list(key) if key is not None else None
+        self.file = file
+        self.hashes = pl.DataFrame(schema = {'__h1': pl.UInt64, '__h2': pl.UInt64})
+        if file and os.path.exists(file):
+            self._load(file)
+
+    def __len__(self):
+        return self.hashes.height
+
+    def _expressions(self, columns, key = None):
+        key = key or self.key or sorted(columns)
+        row = pl.struct([pl.col(col) for col in key])
+        return [row.hash(seed).alias(f"__h{n}") for n, seed in enumerate(self._seeds, 1)]
+
+    def _fingerprint(self):
+        # Hashes of a fixed row: polars does not promise stable hashes
+        # across versions, so a stored set is only valid if these match
+        probe = pl.DataFrame(self._probe).select(
+            self._expressions(self._probe, key = list(self._probe))
+        )
+        return ','.join(str(value) for value in probe.row(0))
+
+    def _load(self, file):
+        # Key/probe live in the parquet schema metadata; written and read
+        # through pyarrow, which supports it on every polars version
+        import pyarrow.parquet as pq
+
+        metadata = {
+            key.decode(): value.decode()
+            for key, value in (pq.read_schema(file).metadata or {}).items()
+        }
+        if metadata.get('dedup_probe') != self._fingerprint():
+            raise ValueError(
+                f"Row hashes in {file} were written by an incompatible polars "
+                f"version ({metadata.get('polars_version')}); delete it to rebuild"
+            )
+        key = json.loads(metadata.get('dedup_key', 'null'))
+        if key != self.key:
+            raise ValueError(f"{file} was built for key {key!r}, not {self.key!r}")
+        self.hashes = pl.read_parquet(file)
+
+    def save(self, file = None):
+        """Atomically write the hash set to file (default: self.file)."""
+        import pyarrow.parquet as pq
 
+        file = file or self.file
+        tmp = file + '.tmp'
+        table = self.hashes.rechunk().to_arrow()
+        table = table.replace_schema_metadata({
+            **(table.schema.metadata or {}),
+            'dedup_key': json.dumps(self.key),
+            'dedup_probe': self._fingerprint(),
+            'polars_version': pl.__version__
+        })
+        pq.write_table(table, tmp)
+        os.replace(tmp, file)
 
-def extract_data(dir_path, columns = None, options = None):
+    def filter(self, data):
+        """Drop rows already seen (and repeats within data), recording the rest.
+        
+        Args:
+            data: polars.DataFrame or polars.LazyFrame
+        
+        Returns:
+            The same kind of frame without duplicate rows. For a LazyFrame,
+            only the key columns are read now; the kept rows are selected
+            lazily by row number.
+        """
+        hashes = data.select(self._expressions(_column_names(data)))
+        if isinstance(hashes, pl.LazyFrame):
+            hashes = hashes.collect()
+
+        new = (
+            hashes
+            .with_row_index('__row')
+            .filter(pl.struct('__h1', '__h2').is_first_distinct())
+            .join(self.hashes, on = ['__h1', '__h2'], how = 'anti')
+            .sort('__row')
+        )
+        self.hashes = pl.concat([self.hashes, new.drop('__row')], rechunk = False)
+
+        if isinstance(data, pl.LazyFrame):
+            return (
+                data
+                .with_row_index('__row')
+                .join(new.select('__row').lazy(), on = '__row', how = 'semi')
+                .drop('__row')
+            )
+        return data[new['__row']]
+
+def _glob_inputs(dir_path):
+    """Plain and gzip/zstd compressed files of each kind, and archives."""
+    inputs = {key: [] for key in ('csv', 'json', 'xml')}
+    for key in inputs:
+        for suffix in ('', '.gz', '.zst'):
+            inputs[key] += glob.glob(os.path.join(dir_path, f"*.{key}{suffix}"))
+    archives = sorted(
+        file for suffix in _archive_suffixes
+        for file in glob.glob(os.path.join(dir_path, '*' + suffix))
+        if not (suffix == '.tar' and file.endswith('.tar.gz'))
+    )
+    return inputs, archives
+
+def extract_file(file, columns = None, options = None, schema = None):
+    """Extract one file with the reader matching its (compressed) suffix.
+    
+    Args:
+        file: Path to a csv, json or xml file (plain, .gz or .zst), or
+              ArchiveMember
+        columns: List of columns to extract (optional)
+        options: Dict of options for the reader (optional)
+        schema: Optional dict of column names to polars data types
+    
+    Returns:
+        polars.DataFrame
+    """
+    readers = {'csv': extract_csv, 'json': extract_json, 'xml': extract_xml}
+    kind = _input_kind(file)
+    if kind is None:
+        raise ValueError(f"Unsupported input file: {file}")
+    return readers[kind](file, columns = columns, options = options, schema = schema)
+
+def extract_data(dir_path, columns = None, options = None, lazy = False,
+                 workers = None, on_error = 'raise', manifest = None,
+                 schema = None, harmonize = False, dedup = None):
     """Extract data from multiple file types in a directory.
     
+    Besides plain *.csv, *.json and *.xml files, gzip (.gz) and zstd (.zst)
+    compressed files and the matching members of zip and tar archives
+    (*.zip, *.tar, *.tar.gz, *.tgz) are read directly without unpacking them
+    to disk. Plain files are memory-mapped; compressed files and archive
+    members are decompressed as a stream and read eagerly even when lazy is
+    True. The manifest tracks archives as a whole. Reading .zst files
+    requires the zstandard package.
+    
     Args:
         dir_path: Path to directory containing files
         columns: List of columns to extract (optional)
+        lazy: If True, scan CSV and JSON files with pl.scan_csv/pl.scan_ndjson
+              and return a single polars.LazyFrame, so column selection and
+              later transforms are pushed down into the scans. XML files are
+              streamed with extract_xml_stream and wrapped as LazyFrames.
+        workers: Number of parallel workers (optional). CSV and JSON files are
+                 read on a thread pool and XML files on a process pool, whose
+                 workers are spawned, so scripts using it need an
+                 if __name__ == "__main__" guard. Output order is the same as
+                 a serial run.
+        on_error: 'raise' (default) to stop on the first unreadable file, or
+                  'skip' to warn and continue with the remaining files
+        manifest: dict from load_manifest (optional). Files whose size, mtime
+                  or content hash already match an entry are skipped; new and
+                  changed files are read and recorded in the dict, which the
+                  caller saves with save_manifest once the load succeeds.
+                  A changed file is re-read in full, so rows it had before
+                  are returned again; pair the manifest with dedup when
+                  appending to the output of earlier runs.
+        schema: Optional dict of column names to polars data types, e.g. the
+                transform_type schema. Each reader casts these columns
+                (non-strict, as transform_type does) in the same pass that
+                reads them, so a dirty value becomes null rather than failing
+                the extract. If files still disagree (e.g. an int column in
+                one file and a float in another), frames are concatenated
+                with how='vertical_relaxed' so they are upcast to a common
+                type.
+        harmonize: If True, compute the union of all files' columns up front
+                   from their headers (CSV header, NDJSON schema inference,
+                   first XML record) without reading them in full, then
+                   reorder and null-fill every file to that union as it is
+                   read. Files with missing, extra or reordered columns no
+                   longer fail the final concatenation.
+        dedup: DedupIndex (optional). Rows already in the index, from
+               earlier files or runs, are dropped file by file and new rows
+               are added to it; the caller saves it with DedupIndex.save
+               once the load succeeds.
         options: Dict with optional keys:
             - csv: Dict of options for CSV extraction
             - json: Dict of options for JSON extraction
-            - xml: Dict of options for XML extraction
+            - xml: Dict of options for XML extraction (passed to
+                   extract_xml_stream when lazy is True)
             
     Example:
         options = {
@@ -105,56 +706,273 @@ def extract_data(dir_path, columns = None, options = None):
             }
         }
         df = extract('data_directory', columns=['col1', 'col2'], options=options)
+
+        # Lazy extraction, collected with the streaming engine (polars
+        # 1.23+; use lf.collect(streaming=True) on older versions)
+        lf = extract_data('data_directory', columns=['col1'], lazy=True)
+        df = lf.collect(engine='streaming')
+
+        # Eight workers, skipping (and warning about) unreadable files
+        df = extract_data('data_directory', workers=8, on_error='skip')
+
+        # Incremental run: only read files not seen by a previous run
+        manifest = load_manifest('manifest.json')
+        df = extract_data('data_directory', manifest=manifest)
+        write_data('out.csv', df, append=True)
+        save_manifest('manifest.json', manifest)
+
+        # Typed extraction: cast numeric columns as they are read
+        df = extract_data('data_directory', schema={'price': pl.Float64})
+
+        # Files with differing columns: union of columns, nulls where missing
+        df = extract_data('data_directory', harmonize=True)
+
+        # Same records in several files or formats: keep the first copy
+        index = DedupIndex(file='seen.parquet')
+        df = extract_data('data_directory', schema=schema, dedup=index)
+        index.save()
+
+        # Archived and compressed inputs, e.g. data.zip and part1.csv.gz
+        df = extract_data('raw_dumps')
     """
 
     # Get any options passed to sub-routines
     options = options or {}
     
-    # Initialize
-    data = []
+    # Collect (reader, file, options) tasks in a deterministic order
+    read_csv = scan_csv if lazy else extract_csv
+    read_json = scan_json if lazy else extract_json
+    read_xml = extract_xml_stream if lazy else extract_xml
 
-    # Read CSV files
-    for file in glob.glob(os.path.join(dir_path, "*.csv")):
-        df = extract_csv(
-            file,
-            columns = columns,
-            options = options.get('csv')
-        )
-        data.append(df)
-    
-    # Read JSON files
-    for file in glob.glob(os.path.join(dir_path, "*.json")):
-        df = extract_json(
-            file,
-            columns = columns,
-            options = options.get('json')
-        )
-        data.append(df)
-    
-    # Read XML files
-    for file in glob.glob(os.path.join(dir_path, "*.xml")):
-        df = extract_xml(
-            file,
-            columns = columns,
-            options = options.get('xml')
-        )
-        data.append(df)
+    readers = {
+        'csv': (read_csv, extract_csv),
+        'json': (read_json, extract_json),
+        'xml': (read_xml, read_xml)
+    }
+
+    with _span('extract_data.glob'):
+        inputs, archives = _glob_inputs(dir_path)
+
+    fingerprints = {}
+    def unseen(file):
+        if manifest is None:
+            return True
+        fingerprint = _manifest_check(file, manifest)
+        if fingerprint is not None:
+            fingerprints[file] = fingerprint
+        return fingerprint is not None
+
+    for archive in archives:
+        if unseen(archive):
+            for member in archive_members(archive):
+                key = _input_kind(member)
+                if key:
+                    inputs[key].append(member)
+
+    tasks = []
+    for key, (reader, eager_reader) in readers.items():
+        for file in sorted(inputs[key], key = str):
+            if isinstance(file, str) and not unseen(file):
+                continue
+            # Scans need a plain path: stream the rest through eager readers
+            plain = isinstance(file, str) and not _compression(file)
+            tasks.append((reader if plain else eager_reader, file, options.get(key), key))
+
+    # Union schema from file headers, and each file's share of it
+    if harmonize:
+        with _span('extract_data.harmonize'):
+            file_columns = []
+            for _, file, opts, key in tasks:
+                try:
+                    file_columns.append(_file_columns(file, key, opts))
+                except Exception:
+                    if on_error != 'skip':
+                        raise
+                    # The read below reports and skips the file
+                    file_columns.append([])
+            union = list(columns) if columns is not None else list(
+                dict.fromkeys(col for cols in file_columns for col in cols)
+            )
+        tasks = [
+            (reader, file, opts, [col for col in union if col in cols])
+            for (reader, file, opts, _), cols in zip(tasks, file_columns)
+        ]
+    else:
+        tasks = [
+            (reader, file, opts, columns) for reader, file, opts, _ in tasks
+        ]
+
+    # Read files, serially or fanned out over worker pools
+    with _span('extract_data.read'):
+        if workers is None or workers <= 1:
+            results = [
+                _extract_file(reader, file, cols, opts, schema, on_error)
+                for reader, file, opts, cols in tasks
+            ]
+        else:
+            results = _extract_parallel(tasks, schema, workers, on_error)
+
+    if harmonize:
+        results = [
+            _conform(df, union, schema) if df is not None else None
+            for df in results
+        ]
+
+    if dedup is not None:
+        with _span('extract_data.dedup'):
+            results = [
+                dedup.filter(df) if df is not None else None
+                for df in results
+            ]
+
+    # Record successfully read files (archives only if every member was)
+    failed = {_input_path(file) for (_, file, _, _), df in zip(tasks, results) if df is None}
+    for file, fingerprint in fingerprints.items():
+        if file not in failed:
+            manifest[os.path.abspath(file)] = fingerprint
+
+    data = [
+        df.lazy() if lazy and isinstance(df, pl.DataFrame) else df
+        for df in results if df is not None
+    ]
     
     # Return combined data or empty data frame if no data
-    return pl.concat(data) if data else pl.DataFrame()
+    if not data:
+        return pl.LazyFrame() if lazy else pl.DataFrame()
+    with _span('extract_data.concat'):
+        if harmonize:
+            how = 'diagonal_relaxed'
+        else:
+            how = 'vertical_relaxed' if schema else 'vertical'
+        return pl.concat(data, how = how)
+
+def _file_columns(file, kind, options = None):
+    """Read a file's column names from its header, without a full read."""
+    options = options or {}
+    streamed = isinstance(file, ArchiveMember) or _compression(file)
+    if kind == 'csv' and not streamed:
+        return pl.scan_csv(file, infer_schema = False, **options).collect_schema().names()
+    if kind == 'json' and not streamed:
+        return pl.scan_ndjson(file, **options).collect_schema().names()
+
+    with open_input(file) as source:
+        if kind == 'csv':
+            # Header line only
+            text = io.TextIOWrapper(source, encoding = 'utf-8', newline = '')
+            header = next(csv.reader(text, delimiter = options.get('separator', ',')), [])
+            return header
+        if kind == 'json':
+            # Keys of the first record only
+            line = source.readline()
+            return list(json.loads(line)) if line.strip() else []
+
+        # XML: tags of the first record
+        tags = []
+        depth = 0
+        parser = _xml_parser(options.get('parse', {}))
+        for event, elem in ET.iterparse(source, events = ('start', 'end'), parser = parser):
+            if event == 'start':
+                depth += 1
+                continue
+            depth -= 1
+            if depth == 2 and elem.tag not in tags:
+                tags.append(elem.tag)
+            elif depth == 1:
+                break
+        return tags
+
+def _conform(data, columns, schema = None):
+    """Select columns in order, adding missing ones as typed nulls."""
+    schema = schema or {}
+    present = set(_column_names(data))
+    return data.select([
+        pl.col(col) if col in present
+        else pl.lit(None, dtype = schema.get(col, pl.String)).alias(col)
+        for col in columns
+    ])
+
+def _extract_file(reader, file, columns, options, schema = None,
+                  on_error = 'raise'):
+    """Run one extractor, warning and returning None on failure if asked."""
+    try:
+        return reader(file, columns = columns, options = options, schema = schema)
+    except Exception as e:
+        if on_error != 'skip':
+            raise
+        warnings.warn(f"Skipping {file}: {e!r}")
+        return None
+
+def _extract_parallel(tasks, schema, workers, on_error = 'raise'):
+    """Extract files concurrently, returning results in task order.
+    
+    Polars readers release the GIL and run on a thread pool; the pure-Python
+    XML extractors run on a process pool. Its workers are spawned rather
+    than forked, since forking while polars threads run can deadlock.
+    """
+    import multiprocessing
+
+    xml_readers = (extract_xml, extract_xml_stream)
+    futures = []
+    context = multiprocessing.get_context('spawn')
+    with ThreadPoolExecutor(max_workers = workers) as threads, \
+            ProcessPoolExecutor(max_workers = workers, mp_context = context) as processes:
+        for reader, file, opts, columns in tasks:
+            if reader in xml_readers:
+                # Parse to plain column lists in a worker process
+                future = processes.submit(
+                    _read_xml_columns,
+                    file,
+                    columns = columns,
+                    options = opts
+                )
+            else:
+                future = threads.submit(
+                    reader,
+                    file,
+                    columns = columns,
+                    options = opts,
+                    schema = schema
+                )
+            futures.append((str(file), reader in xml_readers, opts, future))
+
+        results = []
+        for file, is_xml, opts, future in futures:
+            try:
+                result = future.result()
+                if is_xml:
+                    result = (
+                        _xml_batch(result, (opts or {}).get('df', {}), schema)
+                        if result is not None else pl.DataFrame()
+                    )
+                results.append(result)
+            except Exception as e:
+                if on_error != 'skip':
+                    raise
+                warnings.warn(f"Skipping {file}: {e!r}")
+                results.append(None)
+
+    return results
+
+def _column_names(data):
+    """Return column names of a DataFrame or LazyFrame without collecting."""
+    if isinstance(data, pl.LazyFrame):
+        return data.collect_schema().names()
+    return data.columns
 
 def transform_type(data, schema = None):
     """Transform DataFrame by converting types of schema-defined columns.
     
     Args:
-        df: polars.DataFrame to transform
+        df: polars.DataFrame, polars.LazyFrame or ibis table (see
+            duckdb_connect) to transform
         schema: Optional dict defining columns and their data types
                 Keys are column names and values are polars data types
                 Example: {'price': pl.Float32, 'quantity': pl.Int32}
                 If None, returns DataFrame unchanged
     
     Returns:
-        polars.DataFrame with schema-defined columns converted and all other columns preserved
+        polars.DataFrame (or LazyFrame, if given one) with schema-defined
+        columns converted and all other columns preserved
         
     Example:
         schema = {
@@ -171,16 +989,45 @@ def transform_type(data, schema = None):
     if schema is None:
         return data
 
+    if _is_ibis(data):
+        return _ibis_transform_type(data, schema)
+
     # Loop through schema-defined columns, changing type
     expressions = [
         pl.col(col).cast(
             schema[col],
             strict=False) if col in schema else pl.col(col)
-        for col in data.columns
+        for col in _column_names(data)
     ]
 
     return data.select(expressions)
 
+@functools.lru_cache(maxsize = 1024)
+def unit_factors(from_unit, to_unit):
+    """Return the (scale, offset) pair converting from_unit to to_unit.
+    
+    Conversions are affine, so value_to = value_from * scale + offset. This
+    covers offset units such as celsius -> fahrenheit as well as the purely
+    multiplicative ones. Results are cached per unit pair.
+    
+    Args:
+        from_unit: Source unit (e.g., 'gram', 'cm', 'celsius')
+        to_unit: Target unit (e.g., 'pound', 'inch', 'fahrenheit')
+    
+    Returns:
+        tuple of floats (scale, offset)
+    """
+    ureg = get_registry()
+    offset = ureg.Quantity(0.0, from_unit).to(to_unit).magnitude
+    if not offset:
+        return ureg.Quantity(1.0, from_unit).to(to_unit).magnitude, 0.0
+
+    # Scale from unit differences (delta units), so offsets don't cost precision
+    def delta(unit):
+        return ureg.Quantity(1.0, unit) - ureg.Quantity(0.0, unit)
+    scale = delta(from_unit).to(delta(to_unit).units).magnitude
+    return scale, offset
+
 def apply_conversion(column_name, from_unit, to_unit):
     """Create a polars expression to convert a column from one unit to another.
     
@@ -205,50 +1052,2437 @@ def apply_conversion(column_name, from_unit, to_unit):
             apply_conversion('height', 'cm', 'inch')
         ])
     """
-    factor = ureg(from_unit).to(to_unit).magnitude
-    return pl.col(column_name) * factor
+    scale, offset = unit_factors(from_unit, to_unit)
+    expr = pl.col(column_name) * scale
+    return expr + offset if offset else expr
+
+def _unit_table(data, column_name, unit_column, to_unit):
+    """Build a (unit, scale, offset) lookup table for a per-row unit column."""
+    units = data.select(pl.col(unit_column).unique().drop_nulls())
+    if isinstance(units, pl.LazyFrame):
+        units = units.collect()
+
+    factors = [unit_factors(unit, to_unit) for unit in units[unit_column]]
+    return pl.DataFrame({
+        unit_column: units[unit_column],
+        f"__scale_{column_name}": [scale for scale, _ in factors],
+        f"__offset_{column_name}": [offset for _, offset in factors]
+    }, schema_overrides = {
+        f"__scale_{column_name}": pl.Float64,
+        f"__offset_{column_name}": pl.Float64
+    })
 
 def transform_unit(df, conversions = None):
     """Convert units for specified columns in DataFrame.
     
     Args:
-        df: polars.DataFrame to transform
+        df: polars.DataFrame, polars.LazyFrame or ibis table (see
+            duckdb_connect) to transform
         unit_map: Optional dict mapping column names to unit conversion tuples
                  Each tuple should be (from_unit, to_unit)
                  Example: {'weight': ('gram', 'pound')}
+                 from_unit may also be a column expression, e.g.
+                 pl.col('weight_unit'), holding each row's source unit. The
+                 distinct units are converted once and joined back as a
+                 lookup table.
     
     Returns:
-        polars.DataFrame with unit conversions applied and other columns preserved
+        polars.DataFrame (or LazyFrame, if given one) with unit conversions
+        applied and other columns preserved
 
     Example:
         df = pl.DataFrame({'height': [64.0, 72.0], 'weight': [100.0, 200.0]})
         schema = {
             'height': ('inch', 'meter'),
             'weight': ('pound', 'kilogram')
+        }
         transform_unit(df, conversions = schema)
-    }
+
+        # Per-row source units
+        df = pl.DataFrame({'temp': [20.0, 68.0], 'temp_unit': ['degC', 'degF']})
+        transform_unit(df, conversions = {'temp': (pl.col('temp_unit'), 'kelvin')})
     """
     if conversions is None:
         return df
+
+    if _is_ibis(df):
+        return _ibis_transform_unit(df, conversions)
+
+    columns = _column_names(df)
+    data = df
+    expressions = []
+    for col in columns:
+        if col not in conversions:
+            expressions.append(pl.col(col))
+            continue
+
+        from_unit, to_unit = conversions[col]
+        if not isinstance(from_unit, pl.Expr):
+            expressions.append(apply_conversion(col, from_unit, to_unit))
+            continue
+
+        # Per-row units: join a small lookup table of (scale, offset) pairs
+        unit_column = from_unit.meta.output_name()
+        data = data.join(
+            _unit_table(df, col, unit_column, to_unit).lazy()
+            if isinstance(data, pl.LazyFrame)
+            else _unit_table(df, col, unit_column, to_unit),
+            on = unit_column,
+            how = 'left',
+            maintain_order = 'left'
+        )
+        expressions.append(
+            (pl.col(col) * pl.col(f"__scale_{col}") + pl.col(f"__offset_{col}"))
+            .alias(col)
+        )
     
-    expressions = [
-        apply_conversion(col, *conversions[col]) if col in conversions else pl.col(col)
-        for col in df.columns
-    ]
+    return data.select(expressions)
+
+def transform_currency(df, rates, columns, currencies = None, options = None):
+    """Convert amount columns into other currencies using a table of rates.
+    
+    Each rate is applied as a broadcast literal (pl.col(col) * rate), so no
+    wide intermediate table is built and no per-row fill is needed. Dated
+    rate tables are matched to each row with a single as-of join.
+    
+    Args:
+        df: polars.DataFrame, polars.LazyFrame or ibis table (see
+            duckdb_connect) to transform. ibis tables support static rates
+            only.
+        rates: polars.DataFrame or polars.LazyFrame in long format, one row
+               per currency (and date, for dated rates)
+        columns: List of amount columns to convert
+        currencies: List of currencies to convert into (optional, defaults to
+                    every currency in rates, in table order)
+        options: Dict with optional keys:
+            - currency: Currency column of rates (default 'Currency')
+            - rate: Rate column of rates (default 'Rate')
+            - name: Output column name template with {column} and {currency}
+                    fields (default '{column}_{currency}')
+            - round: Number of decimals to round converted amounts to
+            - date: Date column of df. If given, each row uses the latest
+                    rate on or before its date. Not supported for ibis
+                    tables (TypeError).
+            - rate_date: Date column of rates (default: same as date)
     
-    return df.select(expressions)
+    Returns:
+        polars.DataFrame (or LazyFrame, if given one) with a converted column
+        per amount column and currency added after the existing columns
+    
+    Example:
+        rates = pl.DataFrame({'Currency': ['GBP', 'EUR'], 'Rate': [0.8, 0.93]})
+        transform_currency(df, rates, ['MC_USD_Billion'], options = {
+            'name': 'MC_{currency}_Billion',
+            'round': 2
+        })
 
-def write_data(file, data):
-    data.write_csv(file)
-    """Write transformed data to a csv file.
+        # Dated rates: each trade converted at the rate of its day
+        transform_currency(trades, daily_rates, ['amount'], ['EUR'], options = {
+            'date': 'trade_date',
+            'rate_date': 'Date'
+        })
+    """
+    options = options or {}
+    currency_col = options.get('currency', 'Currency')
+    rate_col = options.get('rate', 'Rate')
+    name = options.get('name', '{column}_{currency}')
+    decimals = options.get('round')
+    date_col = options.get('date')
 
-    Args:
-        file: To location of the file to be written, appended with ".csv"
-        data: The dataframe (polars.DataFrame) to be written to disk
+    if _is_ibis(df):
+        if date_col is not None:
+            raise TypeError("Dated rates are not supported for ibis tables")
+        return _ibis_transform_currency(df, rates, columns, currencies, options)
 
-    Returns:
-        None
+    def converted(col, currency, rate):
+        expr = pl.col(col) * rate
+        if decimals is not None:
+            expr = expr.round(decimals)
+        return expr.alias(name.format(column = col, currency = currency))
 
+    if date_col is None and currencies is not None and isinstance(rates, pl.LazyFrame):
+        # Only the distinct currencies are read to check them, as below
+        found = rates.select(
+            pl.col(currency_col).filter(pl.col(currency_col).is_in(currencies)).unique()
+        ).collect()[currency_col]
+        missing = set(currencies) - set(found)
+        if missing:
+            raise ValueError(f"No rates for currencies: {sorted(missing)}")
+
+        # Lazy rates: cross join a one-row frame of rates rather than collect
+        wide = rates.select([
+            pl.col(rate_col).filter(pl.col(currency_col) == currency).first()
+                .cast(pl.Float64).alias(f"__rate_{currency}")
+            for currency in currencies
+        ])
+        data = df.lazy().join(wide, how = 'cross')
+        data = data.with_columns([
+            converted(col, currency, pl.col(f"__rate_{currency}"))
+            for col in columns for currency in currencies
+        ]).drop([f"__rate_{currency}" for currency in currencies])
+        return data if isinstance(df, pl.LazyFrame) else data.collect()
+
+    if isinstance(rates, pl.LazyFrame):
+        rates = rates.collect()
+    if currencies is None:
+        currencies = rates[currency_col].unique(maintain_order = True).to_list()
+    else:
+        rates = rates.filter(pl.col(currency_col).is_in(currencies))
+        missing = set(currencies) - set(rates[currency_col])
+        if missing:
+            raise ValueError(f"No rates for currencies: {sorted(missing)}")
+
+    if date_col is None:
+        # Static rates: one literal per currency
+        lookup = dict(zip(rates[currency_col], rates[rate_col].cast(pl.Float64)))
+        return df.with_columns([
+            converted(col, currency, pl.lit(lookup[currency]))
+            for col in columns for currency in currencies
+        ])
+
+    # Dated rates: a date x currency table, carried forward over dates a
+    # currency has no quote, matched to every row with one as-of join
+    rate_date = options.get('rate_date', date_col)
+    wide = (
+        rates
+        .with_columns(pl.col(rate_col).cast(pl.Float64))
+        .pivot(on = currency_col, index = rate_date, values = rate_col,
+               aggregate_function = 'last')
+        .sort(rate_date)
+        .select(
+            pl.col(rate_date).alias('__rate_date'),
+            *[
+                pl.col(currency).forward_fill().alias(f"__rate_{currency}")
+                for currency in currencies
+            ]
+        )
+    )
+    data = (
+        df.with_row_index('__row')
+        .sort(date_col)
+        .join_asof(
+            wide.lazy() if isinstance(df, pl.LazyFrame) else wide,
+            left_on = date_col,
+            right_on = '__rate_date',
+            strategy = 'backward'
+        )
+        .with_columns([
+            converted(col, currency, pl.col(f"__rate_{currency}"))
+            for col in columns for currency in currencies
+        ])
+        .sort('__row')
+    )
+    return data.drop(['__row', '__rate_date'] + [f"__rate_{currency}" for currency in currencies])
+
+class TransformPlan:
+    """Declarative transform spec compiled into a single lazy plan.
+    
+    Casts, unit conversions and renames are fused into one expression per
+    column, followed by derived columns, filters and a final projection, all
+    in one LazyFrame. Nothing is materialized between steps, so a wide table
+    is read once rather than copied by every transform_* call, and polars can
+    push the final column selection and filters down through the plan.
+    
+    Steps run in this order, each seeing the output of the previous ones:
+    types, units, rename, derive, filter, select.
+    
+    Plans compile to polars only: for ibis tables, call transform_type and
+    transform_unit directly.
+    
     Example:
-        write_data("my_data.csv", polars_df)
-    """
\ No newline at end of file
+        plan = TransformPlan(
+            types = {'height': pl.Float64, 'weight': pl.Float64},
+            units = {'height': ('inch', 'meter'), 'weight': ('pound', 'kilogram')},
+            rename = {'height': 'height_m'},
+            derive = {'bmi': pl.col('weight') / pl.col('height_m') ** 2},
+            filter = pl.col('bmi') < 40
+        )
+        print(plan.explain(df))
+        df = plan(df)
+    """
+
+    def __init__(self, types = None, units = None, rename = None, derive = None,
+                 filter = None, select = None):
+        """
+        Args:
+            types: Dict of column names to polars data types, as in
+                   transform_type (non-strict casts)
+            units: Dict of column names to (from_unit, to_unit), as in
+                   transform_unit (from_unit may be a per-row unit column)
+            rename: Dict of old to new column names
+            derive: Dict of new column names to polars expressions, which
+                    refer to columns by their renamed names
+            filter: Polars expression, or list of expressions that must all
+                    hold, selecting the rows to keep
+            select: List of output columns to keep (optional, default all)
+        """
+        self.types = types or {}
+        self.units = units or {}
+        self.rename = rename or {}
+        self.derive = derive or {}
+        if isinstance(filter, (list, tuple)):
+            filter = pl.all_horizontal(filter) if filter else None
+        self.filter = filter
+        self.select = select
+
+    def __call__(self, data):
+        return self.apply(data)
+
+    def plan(self, data):
+        """Compile the spec against data into a polars.LazyFrame."""
+        if isinstance(data, dict):
+            # A schema only: plan against an empty frame
+            data = pl.LazyFrame(schema = data)
+        if _is_ibis(data):
+            raise TypeError(
+                "TransformPlan compiles to polars; use transform_type and "
+                "transform_unit for ibis tables"
+            )
+        lf = data.lazy()
+
+        expressions = []
+        for col in _column_names(lf):
+            expr = pl.col(col)
+            if col in self.types:
+                expr = expr.cast(self.types[col], strict = False)
+            if col in self.units:
+                from_unit, to_unit = self.units[col]
+                if isinstance(from_unit, pl.Expr):
+                    # Per-row units: join the small (scale, offset) table
+                    unit_column = from_unit.meta.output_name()
+                    lf = lf.join(
+                        _unit_table(lf, col, unit_column, to_unit).lazy(),
+                        on = unit_column,
+                        how = 'left',
+                        maintain_order = 'left'
+                    )
+                    expr = expr * pl.col(f"__scale_{col}") + pl.col(f"__offset_{col}")
+                else:
+                    scale, offset = unit_factors(from_unit, to_unit)
+                    expr = expr * scale + offset if offset else expr * scale
+            expressions.append(expr.alias(self.rename.get(col, col)))
+        lf = lf.select(expressions)
+
+        if self.derive:
+            lf = lf.with_columns([
+                expr.alias(name) for name, expr in self.derive.items()
+            ])
+        if self.filter is not None:
+            lf = lf.filter(self.filter)
+        if self.select is not None:
+            lf = lf.select(self.select)
+        return lf
+
+    def apply(self, data):
+        """Run the plan on a DataFrame or LazyFrame, returning the same kind."""
+        lf = self.plan(data)
+        return lf if isinstance(data, pl.LazyFrame) else lf.collect()
+
+    def explain(self, data, optimized = True):
+        """Return the (optimized) query plan for data, or for a schema dict."""
+        return self.plan(data).explain(optimized = optimized)
+
+def _data_format(file, format = None):
+    """Infer the output format ('csv', 'parquet' or 'ipc') from a file name."""
+    if format is not None:
+        return format
+    ext = os.path.splitext(file)[1].lower()
+    return {
+        '.parquet': 'parquet',
+        '.ipc': 'ipc',
+        '.arrow': 'ipc',
+        '.feather': 'ipc'
+    }.get(ext, 'csv')
+
+@functools.lru_cache(maxsize = None)
+def _streaming_engine():
+    """True if this polars accepts collect(engine='streaming') (1.23+)."""
+    try:
+        pl.LazyFrame({'a': [0]}).collect(engine = 'streaming')
+    except ValueError:
+        return False
+    return True
+
+def _collect_streaming(data):
+    """Collect a LazyFrame with the streaming engine of this polars version."""
+    if _streaming_engine():
+        return data.collect(engine = 'streaming')
+    with warnings.catch_warnings():
+        # Older polars: the (deprecated) streaming=True engine
+        warnings.simplefilter('ignore', DeprecationWarning)
+        return data.collect(streaming = True)
+
+def _sink(data, method, file, **options):
+    """Sink a LazyFrame, collecting it first where this polars cannot sink
+    the plan (older versions support sinks for a subset of plans only)."""
+    try:
+        with warnings.catch_warnings():
+            # Older polars sinks run on the deprecated streaming engine
+            warnings.simplefilter('ignore', DeprecationWarning)
+            getattr(data, f"sink_{method}")(file, **options)
+    except pl.exceptions.InvalidOperationError:
+        getattr(_collect_streaming(data), f"write_{method}")(file, **options)
+
+def _write_file(file, data, format, options):
+    """Write (or, for LazyFrames, sink) one file in the given format."""
+    if format not in ('parquet', 'ipc', 'csv'):
+        raise ValueError(f"Unsupported format: {format!r}")
+    if isinstance(data, pl.LazyFrame):
+        _sink(data, format, file, **options)
+    else:
+        getattr(data, f"write_{format}")(file, **options)
+
+def _partition_dirs(partition_by, key):
+    """Hive-style directory names for a partition key, with values
+    percent-encoded as hive writers do, so 'a/b' cannot nest directories."""
+    return [
+        f"{col}=__HIVE_DEFAULT_PARTITION__" if value is None
+        else f"{col}={urllib.parse.quote(str(value), safe = '')}"
+        for col, value in zip(partition_by, key)
+    ]
+
+def _write_partitioned(dir_path, data, format, partition_by, options):
+    """Write data as hive-style partitions: dir_path/col=value/part-0.ext."""
+    ext = {'csv': 'csv', 'parquet': 'parquet', 'ipc': 'arrow'}[format]
+
+    if isinstance(data, pl.LazyFrame):
+        if hasattr(pl, 'PartitionBy'):
+            # Native partitioned sink: one pass over the plan, rows routed to
+            # a file per key (large partitions may be split over several)
+            def file_path(args):
+                dirs = _partition_dirs(partition_by, args.partition_keys.row(0))
+                return os.path.join(*dirs, f"part-{args.index_in_partition}.{ext}")
+
+            target = pl.PartitionBy(
+                dir_path,
+                key = partition_by,
+                include_key = False,
+                file_path_provider = file_path
+            )
+            getattr(data, f"sink_{format}")(target, mkdir = True, **options)
+            return
+        # Older polars: run the plan once, then split in memory
+        data = _collect_streaming(data)
+
+    parts = data.partition_by(
+        partition_by,
+        as_dict = True,
+        include_key = False
+    )
+    for key, part in parts.items():
+        part_dir = os.path.join(dir_path, *_partition_dirs(partition_by, key))
+        os.makedirs(part_dir, exist_ok = True)
+        _write_file(os.path.join(part_dir, f"part-0.{ext}"), part, format, options)
+
+def write_data(file, data, append = False, format = None, partition_by = None,
+               options = None):
+    """Write transformed data to a csv, Parquet or Arrow IPC file.
+
+    Args:
+        file: To location of the file to be written. For partitioned output
+              this is the root directory of the partitions.
+        data: The dataframe (polars.DataFrame) to be written to disk. A
+              polars.LazyFrame is streamed to disk with sink_csv, sink_parquet
+              or sink_ipc instead of being collected first. An ibis table is
+              executed by its backend and written as csv or parquet.
+        append: If True, append rows to an existing csv file (writing the
+                header only when the file is new or empty)
+        format: 'csv', 'parquet' or 'ipc' (optional, inferred from the file
+                extension; anything unrecognised is written as csv)
+        partition_by: List of columns to write hive-style partitions on
+                      (optional), e.g. file/year=2024/part-0.parquet. Values
+                      are percent-encoded in directory names. A LazyFrame is
+                      sunk to every partition in one pass where polars has
+                      pl.PartitionBy, else collected once and split.
+        options: Dict of options for the polars writer, e.g. compression,
+                 row_group_size and statistics for Parquet
+
+    Returns:
+        None
+
+    Example:
+        write_data("my_data.csv", polars_df)
+
+        # Zstd-compressed Parquet partitioned on 'year'
+        write_data(
+            "my_data",
+            polars_df,
+            format = "parquet",
+            partition_by = ["year"],
+            options = {'compression': 'zstd', 'row_group_size': 100_000}
+        )
+    """
+    options = options or {}
+    format = _data_format(file, format)
+
+    if _is_ibis(data):
+        # Executed and streamed to disk by the backend (e.g. DuckDB COPY)
+        if append or format not in ('csv', 'parquet'):
+            raise ValueError("ibis tables support csv and parquet output only")
+        if partition_by:
+            options = {**options, 'partition_by': partition_by}
+        writer = data.to_parquet if format == 'parquet' else data.to_csv
+        writer(file, **options)
+        return
+
+    if append:
+        if format != 'csv' or partition_by:
+            raise ValueError("append is only supported for unpartitioned csv output")
+        if isinstance(data, pl.LazyFrame):
+            data = _collect_streaming(data)
+        if data.width == 0:
+            # Nothing new to append
+            return
+        has_header = os.path.exists(file) and os.path.getsize(file) > 0
+        with open(file, 'ab') as f:
+            data.write_csv(f, include_header = not has_header, **options)
+    elif partition_by:
+        _write_partitioned(file, data, format, partition_by, options)
+    else:
+        _write_file(file, data, format, options)
+
+def _iter_batches(data, batch_size):
+    """Yield DataFrame batches of at most batch_size rows."""
+    if isinstance(data, pl.LazyFrame):
+        if hasattr(data, 'collect_batches'):
+            for batch in data.collect_batches(chunk_size = batch_size):
+                # collect_batches may yield batches of a different size
+                yield from batch.iter_slices(batch_size)
+            return
+        # Older polars: spill to an uncompressed Arrow file and read it back
+        # memory-mapped, so only the batch being consumed is resident
+        with tempfile.TemporaryDirectory() as tmp:
+            file = os.path.join(tmp, "batches.arrow")
+            _sink(data, 'ipc', file, compression = None)
+            spilled = pl.read_ipc(file, memory_map = True, rechunk = False)
+            yield from spilled.iter_slices(batch_size)
+        return
+    yield from data.iter_slices(batch_size)
+
+def _sqlite_type(dtype):
+    """Map a polars data type to a SQLite column affinity."""
+    if dtype.is_integer() or dtype == pl.Boolean:
+        return 'INTEGER'
+    if dtype.is_float():
+        return 'REAL'
+    return 'TEXT'
+
+def _quote(name):
+    """Quote a SQLite identifier."""
+    return '"' + name.replace('"', '""') + '"'
+
+def _sqlite_connect(file, pragmas = None):
+    """Open an autocommit connection with the loader pragmas applied."""
+    conn = sqlite3.connect(file, isolation_level = None)
+    for name, value in {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        **(pragmas or {})
+    }.items():
+        conn.execute(f"PRAGMA {name} = {value}")
+    return conn
+
+def load_sqlite(file, table, data, mode = 'append', key = None,
+                batch_size = 50_000, pragmas = None, indexes = None):
+    """Load data into a SQLite table in batched transactions.
+    
+    Rows are streamed in batches with executemany, committing once per
+    batch, so memory is bounded by batch_size rather than the size of the
+    frame. Secondary indexes are created after the data is loaded.
+    
+    Args:
+        file: Path to SQLite database file
+        table: Name of the table to load into
+        data: polars.DataFrame or polars.LazyFrame to load
+        mode: 'append' (create the table if needed and insert), 'replace'
+              (load a new table, then swap it for the old one in a single
+              transaction, so a failed load leaves the old table as it was)
+              or 'upsert' (insert, updating rows whose key already exists)
+        key: List of key columns; required for 'upsert', where a unique
+             index on them is created with the table
+        batch_size: Number of rows per executemany/transaction
+        pragmas: Dict of SQLite pragmas, merged over the defaults
+                 {'journal_mode': 'WAL', 'synchronous': 'NORMAL'}
+        indexes: List of column lists to create (non-unique) indexes on after
+                 loading (optional)
+    
+    Returns:
+        Number of rows loaded
+        
+    Example:
+        load_sqlite("data.db", "cars", df, mode = "replace", indexes = [["model"]])
+        load_sqlite("data.db", "cars", df, mode = "upsert", key = ["id"])
+    """
+    if mode not in ('append', 'replace', 'upsert'):
+        raise ValueError(f"Unsupported mode: {mode!r}")
+    if mode == 'upsert' and not key:
+        raise ValueError("upsert mode requires key columns")
+
+    if isinstance(data, pl.LazyFrame):
+        schema = data.collect_schema()
+    else:
+        schema = data.schema
+    columns = list(schema)
+    quoted = ", ".join(_quote(col) for col in columns)
+    placeholders = ", ".join("?" for _ in columns)
+
+    # Replacements load into a staging table that is swapped in at the end,
+    # so a failed load leaves the old table untouched
+    target = f"{table}__staging" if mode == 'replace' else table
+    insert = f"INSERT INTO {_quote(target)} ({quoted}) VALUES ({placeholders})"
+    if mode == 'upsert':
+        updates = ", ".join(
+            f"{_quote(col)} = excluded.{_quote(col)}"
+            for col in columns if col not in key
+        )
+        conflict = ", ".join(_quote(col) for col in key)
+        insert += (
+            f" ON CONFLICT ({conflict}) DO UPDATE SET {updates}" if updates
+            else f" ON CONFLICT ({conflict}) DO NOTHING"
+        )
+
+    # Temporal and other non-native types are stored as text
+    to_sqlite = [
+        pl.col(col) if _sqlite_type(dtype) != 'TEXT' or dtype == pl.String
+        else pl.col(col).cast(pl.String)
+        for col, dtype in schema.items()
+    ]
+
+    conn = _sqlite_connect(file, pragmas)
+    try:
+        if mode == 'replace':
+            # Left over by an interrupted load
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(target)}")
+        else:
+            # Any write outside merge_sqlite invalidates its row hashes
+            conn.execute(f"DROP TABLE IF EXISTS {_quote(f'{table}__merge')}")
+        definitions = ", ".join(
+            f"{_quote(col)} {_sqlite_type(dtype)}" for col, dtype in schema.items()
+        )
+        conn.execute(f"CREATE TABLE IF NOT EXISTS {_quote(target)} ({definitions})")
+        if mode == 'upsert':
+            conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'{table}_key')} "
+                f"ON {_quote(table)} ({', '.join(_quote(col) for col in key)})"
+            )
+
+        n_rows = 0
+        for batch in _iter_batches(data, batch_size):
+            conn.execute("BEGIN")
+            try:
+                conn.executemany(insert, batch.select(to_sqlite).iter_rows())
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+            n_rows += batch.height
+
+        if mode == 'replace':
+            conn.execute("BEGIN")
+            try:
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(table)}")
+                conn.execute(f"DROP TABLE IF EXISTS {_quote(f'{table}__merge')}")
+                conn.execute(f"ALTER TABLE {_quote(target)} RENAME TO {_quote(table)}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+        # Deferred index creation, once the data is in place
+        for index in indexes or []:
+            name = f"{table}_{'_'.join(index)}_idx"
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {_quote(name)} "
+                f"ON {_quote(table)} ({', '.join(_quote(col) for col in index)})"
+            )
+    finally:
+        conn.close()
+
+    return n_rows
+
+def _storage_dtype(dtype):
+    """The polars type a column round-trips through SQLite as."""
+    affinity = _sqlite_type(dtype)
+    return {'INTEGER': pl.Int64, 'REAL': pl.Float64}.get(affinity, pl.String)
+
+def _merge_hashes(data, key, storage):
+    """Key columns plus a signed 64-bit hash of the remaining columns."""
+    values = [col for col in storage if col not in key]
+    row = pl.struct([pl.col(col) for col in values]) if values else pl.lit(0)
+    return data.select(
+        *[pl.col(col) for col in key],
+        row.hash(0).reinterpret(signed = True).alias('__hash')
+    )
+
+def merge_sqlite(file, table, data, key, delete = True, batch_size = 50_000,
+                 pragmas = None):
+    """Merge data into a SQLite table, applying only the rows that changed.
+    
+    A hash of every row's non-key columns is kept in a side table
+    ({table}__merge) next to the target. Each merge compares the incoming
+    rows to those hashes by key, then applies the inserts, updates and
+    deletes in a single transaction, so the cost scales with the size of
+    the change rather than of the table. The target table itself keeps
+    exactly the columns of data.
+    
+    The first merge into a table that already has rows (e.g. one written
+    by load_sqlite) reads it once to build the hashes. Hashes come from
+    polars, so after a polars upgrade that changes its hashing, one merge
+    may rewrite every row.
+    
+    Args:
+        file: Path to SQLite database file
+        table: Name of the table to merge into (created if needed)
+        data: polars.DataFrame or polars.LazyFrame with the full current
+              contents of the table
+        key: List of columns identifying a row; must be unique in data
+        delete: If True (default), delete rows whose key is not in data
+        batch_size: Number of rows per executemany call
+        pragmas: Dict of SQLite pragmas, as in load_sqlite
+    
+    Returns:
+        dict with the number of rows 'inserted', 'updated', 'deleted' and
+        'unchanged'
+        
+    Example:
+        counts = merge_sqlite("Banks.db", "Largest_banks", df, key = ["Name"])
+        logger("Merged Largest_banks", **counts)
+    """
+    if not key:
+        raise ValueError("merge requires key columns")
+    if isinstance(data, pl.LazyFrame):
+        data = data.collect()
+    if data.select(pl.struct(key).is_duplicated().any()).item():
+        raise ValueError(f"Duplicate keys in data for {key}")
+
+    storage = {col: _storage_dtype(dtype) for col, dtype in data.schema.items()}
+    data = data.cast(storage)
+    incoming = _merge_hashes(data, key, storage)
+
+    columns = list(storage)
+    hash_table = f"{table}__merge"
+    quoted_key = ", ".join(_quote(col) for col in key)
+    match = " AND ".join(f"{_quote(col)} = ?" for col in key)
+
+    conn = _sqlite_connect(file, pragmas)
+    try:
+        def exists(name):
+            return conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (name,)
+            ).fetchone() is not None
+
+        def read(query, schema):
+            cursor = conn.execute(query)
+            return pl.DataFrame(
+                cursor.fetchall(),
+                schema = schema,
+                orient = 'row'
+            )
+
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if not exists(table):
+                definitions = ", ".join(
+                    f"{_quote(col)} {_sqlite_type(dtype)}" for col, dtype in storage.items()
+                )
+                conn.execute(f"CREATE TABLE {_quote(table)} ({definitions})")
+            conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {_quote(f'{table}_key')} "
+                f"ON {_quote(table)} ({quoted_key})"
+            )
+
+            if not exists(hash_table):
+                conn.execute(
+                    f"CREATE TABLE {_quote(hash_table)} ("
+                    + "".join(f"{_quote(col)} {_sqlite_type(storage[col])}, " for col in key)
+                    + f"__hash INTEGER, PRIMARY KEY ({quoted_key}))"
+                )
+                # Existing rows without hashes: hash them once
+                current = read(
+                    f"SELECT {', '.join(_quote(col) for col in columns)} FROM {_quote(table)}",
+                    storage
+                )
+                conn.executemany(
+                    f"INSERT INTO {_quote(hash_table)} VALUES "
+                    f"({', '.join('?' for _ in key)}, ?)",
+                    _merge_hashes(current, key, storage).iter_rows()
+                )
+
+            existing = read(
+                f"SELECT {quoted_key}, __hash FROM {_quote(hash_table)}",
+                {**{col: storage[col] for col in key}, '__hash': pl.Int64}
+            )
+            joined = incoming.join(existing, on = key, how = 'left', suffix = '_old')
+            inserts = joined.filter(pl.col('__hash_old').is_null())
+            updates = joined.filter(
+                pl.col('__hash_old').is_not_null() & (pl.col('__hash') != pl.col('__hash_old'))
+            )
+            deletes = (
+                existing.join(incoming, on = key, how = 'anti').select(key)
+                if delete else existing.clear().select(key)
+            )
+
+            # Target table
+            values = [col for col in columns if col not in key]
+            insert_rows = data.join(inserts.select(key), on = key, how = 'semi')
+            update_rows = data.join(updates.select(key), on = key, how = 'semi')
+            for batch in deletes.iter_slices(batch_size):
+                conn.executemany(f"DELETE FROM {_quote(table)} WHERE {match}", batch.iter_rows())
+                conn.executemany(f"DELETE FROM {_quote(hash_table)} WHERE {match}", batch.iter_rows())
+            if values:
+                assignments = ", ".join(f"{_quote(col)} = ?" for col in values)
+                for batch in update_rows.select(values + key).iter_slices(batch_size):
+                    conn.executemany(
+                        f"UPDATE {_quote(table)} SET {assignments} WHERE {match}",
+                        batch.iter_rows()
+                    )
+            for batch in insert_rows.iter_slices(batch_size):
+                conn.executemany(
+                    f"INSERT INTO {_quote(table)} ({', '.join(_quote(col) for col in columns)}) "
+                    f"VALUES ({', '.join('?' for _ in columns)})",
+                    batch.iter_rows()
+                )
+
+            # Hashes of inserted and updated rows
+            for batch in pl.concat([inserts, updates]).select(key + ['__hash']).iter_slices(batch_size):
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO {_quote(hash_table)} VALUES "
+                    f"({', '.join('?' for _ in key)}, ?)",
+                    batch.iter_rows()
+                )
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+
+    return {
+        'inserted': inserts.height,
+        'updated': updates.height,
+        'deleted': deletes.height,
+        'unchanged': incoming.height - inserts.height - updates.height
+    }
+
+_query_cache = {}
+_query_cache_size = 128
+_query_lock = threading.Lock()
+_query_connections = threading.local()
+
+def sqlite_version(file):
+    """Return a token that changes whenever a SQLite database is written.
+    
+    Built from the inode, size and modification time of the database file
+    and its write-ahead log, so it is cheap to compute (no query) and valid
+    across processes and connections, unlike PRAGMA data_version, and a
+    database replaced at the same path is a new version. (The change counter
+    in the file header is not kept up to date in WAL mode.)
+    
+    Args:
+        file: Path to SQLite database file
+    
+    Returns:
+        str version token
+    """
+    stat = os.stat(file)
+    version = f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+    wal = file + '-wal'
+    stat = os.stat(wal) if os.path.exists(wal) else None
+    if stat and stat.st_size:
+        # Commits not yet checkpointed into the main file
+        version += f":{stat.st_size}:{stat.st_mtime_ns}"
+    return version
+
+def _query_connection(file):
+    """A read-only connection per thread and database, kept open so that
+    sqlite3's statement cache reuses prepared queries across calls.
+    
+    Connections are reopened when the file at the path is a different one
+    (deleted and recreated, or replaced with os.replace), since an open
+    connection keeps reading the file it was opened on.
+    """
+    connections = getattr(_query_connections, 'connections', None)
+    if connections is None:
+        connections = _query_connections.connections = {}
+    key = os.path.abspath(file)
+    stat = os.stat(key)
+    inode = (stat.st_dev, stat.st_ino)
+    pooled = connections.get(key)
+    if pooled is None or pooled[0] != inode:
+        if pooled is not None:
+            pooled[1].close()
+        conn = sqlite3.connect(f"file:{key}?mode=ro", uri = True, cached_statements = 256)
+        connections[key] = pooled = (inode, conn)
+    return pooled[1]
+
+# Declared type substrings to dtypes, in SQLite's column affinity order
+_sqlite_affinities = [
+    ('INT', pl.Int64),
+    ('CHAR', pl.String),
+    ('CLOB', pl.String),
+    ('TEXT', pl.String),
+    ('BLOB', pl.Binary),
+    ('REAL', pl.Float64),
+    ('FLOA', pl.Float64),
+    ('DOUB', pl.Float64)
+]
+
+def _query_schema(conn, query, columns, params):
+    """Schema for an empty query result, from declared column types.
+    
+    SQLite types values, not result columns, so with no rows the types are
+    read from a temporary view of the query. Views cannot take parameters,
+    and expressions have no declared type; those columns are strings.
+    """
+    declared = []
+    if not params:
+        view = f"__query_{uuid.uuid4().hex}"
+        try:
+            conn.execute(f"CREATE TEMP VIEW {view} AS {query}")
+            try:
+                info = conn.execute(f"PRAGMA temp.table_info({view})").fetchall()
+                declared = [row[2].upper() for row in info]
+            finally:
+                conn.execute(f"DROP VIEW temp.{view}")
+        except sqlite3.Error:
+            declared = []
+
+    schema = {}
+    for n, col in enumerate(columns):
+        decl = declared[n] if n < len(declared) else ''
+        dtype = pl.String
+        if decl:
+            # Declared types matching no affinity rule have NUMERIC affinity
+            dtype = next((dt for part, dt in _sqlite_affinities if part in decl), pl.Float64)
+        schema[col] = dtype
+    return schema
+
+def query_sqlite(file, query, params = None, conn = None, cache = True,
+                 cache_dir = None):
+    """Run a (parameterized) query on a SQLite database into a DataFrame.
+    
+    Rows are fetched straight into polars, without a pandas round trip.
+    Results are cached by database path, query text, parameters and
+    sqlite_version, so an identical query on an unchanged database is
+    answered from the cache and any write to the database invalidates it.
+    Queries run as prepared statements on a pooled read-only connection.
+    Column types come from the returned values, or for an empty result from
+    the declared column types where SQLite reports them (strings otherwise).
+    
+    Args:
+        file: Path to SQLite database file
+        query: SQL text, with ? or :name placeholders for params
+        params: Sequence or dict of query parameters (optional)
+        conn: sqlite3.Connection to run the query on (optional; defaults to
+              a read-only connection kept open per thread)
+        cache: If True (default), keep results in an in-process cache of the
+               last 128 distinct queries
+        cache_dir: Directory to also persist results to as parquet, so they
+                   are reused across runs (optional)
+    
+    Returns:
+        polars.DataFrame with the query result
+        
+    Example:
+        query_sqlite("Banks.db", "SELECT Name FROM Largest_banks LIMIT ?", [5])
+        query_sqlite(
+            "World_Economies.db",
+            "SELECT * FROM Countries_by_GDP WHERE GDP_USD_billions >= :min",
+            {'min': 100},
+            cache_dir = "data/processed/query_cache"
+        )
+    """
+    params = params if params is not None else ()
+    key = json.dumps(
+        [os.path.abspath(file), query, params, sqlite_version(file)],
+        default = str
+    )
+
+    if cache:
+        with _query_lock:
+            if key in _query_cache:
+                # Move to the most recently used end
+                _query_cache[key] = _query_cache.pop(key)
+                return _query_cache[key]
+
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    cached = os.path.join(cache_dir, f"{digest}.parquet") if cache_dir else None
+    if cached and os.path.exists(cached):
+        result = pl.read_parquet(cached)
+    else:
+        connection = conn or _query_connection(file)
+        cursor = connection.execute(query, params)
+        columns = [column[0] for column in cursor.description or ()]
+        rows = cursor.fetchall()
+        if rows:
+            result = pl.DataFrame(
+                rows,
+                schema = columns,
+                orient = 'row',
+                infer_schema_length = None
+            )
+        else:
+            result = pl.DataFrame(schema = _query_schema(connection, query, columns, params))
+        if cached:
+            os.makedirs(cache_dir, exist_ok = True)
+            tmp = cached + '.tmp'
+            result.write_parquet(tmp)
+            os.replace(tmp, cached)
+
+    if cache:
+        with _query_lock:
+            _query_cache[key] = result
+            while len(_query_cache) > _query_cache_size:
+                _query_cache.pop(next(iter(_query_cache)))
+    return result
+
+class _StopParsing(Exception):
+    """Raised by _TableParser once the target table has been read."""
+
+class _TableParser(HTMLParser):
+    """Streaming parser collecting the rows of the index-th <tbody>.
+    
+    Only the targeted tbody is materialized, as lists of (tag, text, rowspan,
+    colspan) cells per row; everything else in the page is skipped as it is
+    tokenized, and parsing stops as soon as the tbody closes.
+    """
+
+    def __init__(self, index = 0, skip_classes = ()):
+        super().__init__(convert_charrefs = True)
+        self.index = index
+        self.skip_classes = set(skip_classes)
+        self.seen = 0
+        self.depth = 0        # tbody nesting depth within the target
+        self.rows = []
+        self.row = None
+        self.cell = None
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tbody':
+            if self.depth:
+                self.depth += 1
+            elif self.seen == self.index:
+                self.depth = 1
+            self.seen += 1
+            return
+        if self.depth != 1:
+            return
+
+        attrs = dict(attrs)
+        if tag == 'tr':
+            # </tr> is optional in HTML: a new row closes the open one
+            self._close_row()
+            classes = (attrs.get('class') or '').split()
+            skip = any(c in self.skip_classes for c in classes)
+            self.row = None if skip else []
+            self.cell = None
+        elif tag in ('td', 'th') and self.row is not None:
+            self.cell = [tag, [], _cell_span(attrs.get('rowspan')), _cell_span(attrs.get('colspan'))]
+            self.row.append(self.cell)
+
+    def handle_endtag(self, tag):
+        if tag == 'tbody' and self.depth:
+            self.depth -= 1
+            if not self.depth:
+                self._close_row()
+                raise _StopParsing
+        elif self.depth == 1:
+            if tag == 'tr':
+                self._close_row()
+            elif tag in ('td', 'th'):
+                self.cell = None
+
+    def handle_data(self, data):
+        if self.depth and self.cell is not None:
+            self.cell[1].append(data)
+
+    def _close_row(self):
+        if self.row:
+            self.rows.append([
+                (tag, "".join(text).strip(), rowspan, colspan)
+                for tag, text, rowspan, colspan in self.row
+            ])
+        self.row = None
+        self.cell = None
+
+def _cell_span(value):
+    """Parse a rowspan/colspan attribute, defaulting to 1."""
+    try:
+        return max(int(value), 1)
+    except (TypeError, ValueError):
+        return 1
+
+def _expand_spans(rows):
+    """Lay out cells on a grid, repeating rowspan/colspan cells."""
+    pending = {}    # column -> (rows remaining, tag, text)
+    grid = []
+    for row in rows:
+        out = []
+        cells = iter(row)
+        col = 0
+        while True:
+            if col in pending:
+                remaining, tag, text = pending[col]
+                out.append((tag, text))
+                if remaining > 1:
+                    pending[col] = (remaining - 1, tag, text)
+                else:
+                    del pending[col]
+                col += 1
+                continue
+            cell = next(cells, None)
+            if cell is None:
+                break
+            tag, text, rowspan, colspan = cell
+            for _ in range(colspan):
+                out.append((tag, text))
+                if rowspan > 1:
+                    pending[col] = (rowspan - 1, tag, text)
+                col += 1
+        # Spans reaching past the end of a short row
+        while col in pending:
+            remaining, tag, text = pending.pop(col)
+            out.append((tag, text))
+            if remaining > 1:
+                pending[col] = (remaining - 1, tag, text)
+            col += 1
+        grid.append(out)
+    return grid
+
+def extract_html_table(html, index = 0, headers = None, options = None):
+    """Extract a table from an HTML page into a DataFrame.
+    
+    The page is tokenized with a streaming parser that only keeps the
+    targeted <tbody> (no full document tree is built) and stops once that
+    tbody closes. rowspan/colspan cells are repeated into every position they
+    cover, and columns are built directly from the cell text.
+    
+    Args:
+        html: HTML page as a string (or a file-like object with .read())
+        index: Position of the <tbody> in the page (0 is the first)
+        headers: List of column names (optional). If None, the first row made
+                 only of <th> cells is used as the header, and rows repeating
+                 it are dropped.
+        options: Dict with optional keys:
+            - cells: Cell tags kept as data, default ('td', 'th'); use
+                     ('td',) to ignore row header cells
+            - skip_classes: <tr> classes to skip, default
+                            ('static-row-header',)
+            - spans: If False, ignore rowspan/colspan so every cell is
+                     counted once (default True)
+            - chunk_size: Characters fed to the parser at a time
+    
+    Returns:
+        polars.DataFrame of strings. When headers are known, rows whose length
+        differs from the header are dropped.
+        
+    Example:
+        html = requests.get(url).text
+        df = extract_html_table(html, 0, ['Rank', 'Name', 'MC_USD_Billion'],
+                                options = {'cells': ('td',)})
+    """
+    options = options or {}
+    cells = set(options.get('cells', ('td', 'th')))
+    chunk_size = options.get('chunk_size', 1 << 16)
+
+    parser = _TableParser(index, options.get('skip_classes', ('static-row-header',)))
+    read = html.read if hasattr(html, 'read') else None
+    try:
+        if read is None:
+            for start in range(0, len(html), chunk_size):
+                parser.feed(html[start:start + chunk_size])
+        else:
+            for chunk in iter(lambda: read(chunk_size), ''):
+                parser.feed(chunk)
+        parser.close()
+    except _StopParsing:
+        pass
+
+    if parser.seen <= index:
+        raise IndexError(f"Page has {parser.seen} tbody elements, no index {index}")
+
+    if options.get('spans', True):
+        grid = _expand_spans(parser.rows)
+    else:
+        grid = [[(tag, text) for tag, text, _, _ in row] for row in parser.rows]
+
+    if headers is None:
+        header_row = next(
+            (row for row in grid if row and all(tag == 'th' for tag, _ in row)),
+            None
+        )
+        headers = [text for _, text in header_row] if header_row else None
+
+    rows = []
+    for row in grid:
+        values = [text for tag, text in row if tag in cells]
+        if not values or values == headers:
+            continue
+        rows.append(values)
+
+    if headers is None:
+        width = max((len(row) for row in rows), default = 0)
+        headers = [f'column_{i}' for i in range(width)]
+        rows = [row + [None] * (width - len(row)) for row in rows]
+    else:
+        rows = [row for row in rows if len(row) == len(headers)]
+
+    columns = list(zip(*rows)) if rows else [[] for _ in headers]
+    return pl.DataFrame(
+        {name: list(values) for name, values in zip(headers, columns)},
+        schema = {name: pl.String for name in headers}
+    )
+
+_retry_statuses = {429, 500, 502, 503, 504}
+
+def make_session(pool_size = 10):
+    """Create a requests.Session with a connection pool of pool_size."""
+    import requests
+
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(
+        pool_connections = pool_size,
+        pool_maxsize = pool_size
+    )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def _cache_paths(cache_dir, url):
+    """Return the metadata path for url and the content-addressed object dir."""
+    key = hashlib.sha256(url.encode()).hexdigest()
+    return (
+        os.path.join(cache_dir, 'meta', key + '.json'),
+        os.path.join(cache_dir, 'objects')
+    )
+
+def _read_cache(cache_dir, url):
+    """Return (metadata, body bytes) for a cached url, or (None, None)."""
+    meta_file, objects = _cache_paths(cache_dir, url)
+    try:
+        with open(meta_file) as f:
+            meta = json.load(f)
+        with open(os.path.join(objects, meta['sha256']), 'rb') as f:
+            return meta, f.read()
+    except (OSError, ValueError, KeyError):
+        return None, None
+
+def _write_cache(cache_dir, url, response):
+    """Store a response body by content hash, plus its validators by url."""
+    meta_file, objects = _cache_paths(cache_dir, url)
+    body = response.content
+    digest = hashlib.sha256(body).hexdigest()
+    os.makedirs(objects, exist_ok = True)
+    os.makedirs(os.path.dirname(meta_file), exist_ok = True)
+
+    object_file = os.path.join(objects, digest)
+    if not os.path.exists(object_file):
+        with open(object_file + '.tmp', 'wb') as f:
+            f.write(body)
+        os.replace(object_file + '.tmp', object_file)
+
+    meta = {
+        'url': url,
+        'sha256': digest,
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'encoding': response.encoding,
+        'fetched': time.time()
+    }
+    with open(meta_file + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_file + '.tmp', meta_file)
+    return meta
+
+def _touch_cache(cache_dir, url, meta):
+    """Record that a cached response was revalidated just now."""
+    meta_file, _ = _cache_paths(cache_dir, url)
+    meta = {**meta, 'fetched': time.time()}
+    with open(meta_file + '.tmp', 'w') as f:
+        json.dump(meta, f)
+    os.replace(meta_file + '.tmp', meta_file)
+
+def fetch_url(url, session = None, cache_dir = None, max_age = None,
+              timeout = 30, retries = 3, backoff = 0.5):
+    """Fetch a URL as text, with retries and an optional on-disk cache.
+    
+    With cache_dir, bodies are stored by content hash and revalidated with
+    If-None-Match/If-Modified-Since from the stored ETag/Last-Modified, so an
+    unchanged page costs a 304 instead of a download. Within max_age seconds
+    of the last fetch the cached body is returned without any request.
+    
+    Args:
+        url: URL to fetch
+        session: requests.Session to reuse connections (optional, see
+                 make_session). Without one, a session is made for the
+                 call and closed afterwards.
+        cache_dir: Directory for the response cache (optional)
+        max_age: Seconds a cached response is used without revalidation
+                 (optional; None always revalidates)
+        timeout: Request timeout in seconds
+        retries: Number of retries on connection errors, timeouts and 429/5xx
+                 responses
+        backoff: Base delay in seconds, doubled after every retry
+    
+    Returns:
+        Response body as str
+        
+    Example:
+        html = fetch_url(url, cache_dir = "data/raw/cache", max_age = 3600)
+    """
+    import requests
+
+    meta, body = _read_cache(cache_dir, url) if cache_dir else (None, None)
+
+    if meta and max_age is not None and time.time() - meta['fetched'] < max_age:
+        return body.decode(meta['encoding'] or 'utf-8', errors = 'replace')
+
+    headers = {}
+    if meta:
+        if meta['etag']:
+            headers['If-None-Match'] = meta['etag']
+        if meta['last_modified']:
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    # A session made here is closed again, releasing its connection
+    owned = session is None
+    session = session or make_session(pool_size = 1)
+    try:
+        for attempt in range(retries + 1):
+            try:
+                response = session.get(url, headers = headers, timeout = timeout)
+                if response.status_code not in _retry_statuses:
+                    break
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == retries:
+                    raise
+            if attempt < retries:
+                time.sleep(backoff * 2 ** attempt)
+    finally:
+        if owned:
+            session.close()
+
+    if response.status_code == 304 and meta:
+        _touch_cache(cache_dir, url, meta)
+        return body.decode(meta['encoding'] or 'utf-8', errors = 'replace')
+
+    response.raise_for_status()
+    if cache_dir:
+        _write_cache(cache_dir, url, response)
+    return response.text
+
+def fetch_urls(urls, workers = 8, on_error = 'raise', **kwargs):
+    """Fetch many URLs concurrently over one pooled session.
+    
+    Args:
+        urls: List of URLs
+        workers: Number of concurrent requests
+        on_error: 'raise' (default) to re-raise the first failure, or 'skip'
+                  to warn and return None for failed URLs
+        **kwargs: Options passed to fetch_url (cache_dir, max_age, timeout,
+                  retries, backoff)
+    
+    Returns:
+        List of response bodies (str), in the order of urls
+    """
+    session = make_session(pool_size = workers)
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        futures = [
+            pool.submit(fetch_url, url, session = session, **kwargs)
+            for url in urls
+        ]
+        results = []
+        for url, future in zip(urls, futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                if on_error != 'skip':
+                    raise
+                warnings.warn(f"Skipping {url}: {e!r}")
+                results.append(None)
+    return results
+
+def _checkpoint_file(checkpoint_dir, name):
+    return os.path.join(checkpoint_dir, f"{name}.parquet")
+
+def _checkpoint(checkpoint_dir, name, output):
+    """Write a stage output to disk and return a scan of the written file."""
+    file = _checkpoint_file(checkpoint_dir, name)
+    tmp = file + '.tmp'
+    if isinstance(output, pl.LazyFrame):
+        _sink(output, 'parquet', tmp)
+    else:
+        output.write_parquet(tmp)
+    # Only a completed write is visible as a checkpoint
+    os.replace(tmp, file)
+    return pl.scan_parquet(file)
+
+def _stage_order(stages):
+    """Validate stage inputs and return a topological order."""
+    order, state = [], {}
+
+    def visit(name, path):
+        if state.get(name) == 'done':
+            return
+        if state.get(name) == 'visiting':
+            raise ValueError(f"Pipeline has a cycle: {' -> '.join(path + [name])}")
+        if name not in stages:
+            raise ValueError(f"Unknown stage {name!r} (input of {path[-1]!r})")
+        state[name] = 'visiting'
+        for dep in stages[name].get('inputs', []):
+            visit(dep, path + [name])
+        state[name] = 'done'
+        order.append(name)
+
+    for name in stages:
+        visit(name, [])
+    return order
+
+def run_pipeline(stages, checkpoint_dir = None, workers = 4, resume = True,
+                 log = None):
+    """Run a DAG of ETL stages, concurrently where they are independent.
+    
+    Each stage is called with the outputs of its inputs (in order) followed
+    by its keyword arguments. Stages whose inputs are all finished run
+    concurrently on a thread pool, and LazyFrames are passed between stages
+    as-is, so nothing is collected unless a stage does so.
+    
+    With checkpoint_dir, frame outputs of stages with 'checkpoint' set are
+    written to checkpoint_dir/<stage>.parquet and downstream stages scan the
+    file. With resume, a stage whose checkpoint exists is not run again, so a
+    failed load can be rerun without re-extracting. Once every stage has
+    succeeded a _SUCCESS marker is written, and the next run deletes the
+    marked checkpoints instead of resuming from them, so returned outputs stay
+    readable until then but are never reused as another run's progress.
+    
+    Args:
+        stages: Dict mapping stage names to dicts with keys:
+            - func: Callable run for the stage
+            - inputs: List of upstream stage names (optional)
+            - kwargs: Dict of keyword arguments for func (optional)
+            - checkpoint: If True, checkpoint the stage output (optional)
+        checkpoint_dir: Directory for stage checkpoints (optional)
+        workers: Maximum number of stages running at once
+        resume: If True, reuse checkpoints left by a failed run instead of
+                rerunning their stages
+        log: Callable taking a message string, e.g. a log_progress function
+             (optional). A StageLogger also records per-stage timings.
+    
+    Returns:
+        Dict mapping stage names to their outputs
+        
+    Example:
+        stages = {
+            'extract': {
+                'func': extract_data,
+                'kwargs': {'dir_path': 'data/raw', 'lazy': True},
+                'checkpoint': True
+            },
+            'typed': {
+                'func': transform_type,
+                'inputs': ['extract'],
+                'kwargs': {'schema': {'price': pl.Float64}}
+            },
+            'load': {
+                'func': lambda df: write_data('out.parquet', df),
+                'inputs': ['typed']
+            }
+        }
+        run_pipeline(stages, checkpoint_dir = 'data/checkpoints')
+    """
+    log = log or (lambda message: None)
+    order = _stage_order(stages)
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok = True)
+        marker = os.path.join(checkpoint_dir, '_SUCCESS')
+        if os.path.exists(marker):
+            # The previous run finished, so its checkpoints are not progress
+            for name in stages:
+                file = _checkpoint_file(checkpoint_dir, name)
+                if os.path.exists(file):
+                    os.remove(file)
+            os.remove(marker)
+
+    def run_stage(name, inputs):
+        stage = stages[name]
+        if checkpoint_dir and stage.get('checkpoint'):
+            file = _checkpoint_file(checkpoint_dir, name)
+            if resume and os.path.exists(file):
+                log(f"Stage {name} restored from checkpoint")
+                return pl.scan_parquet(file)
+
+        log(f"Stage {name} started")
+        timer = (
+            log.stage(name) if isinstance(log, StageLogger)
+            else contextlib.nullcontext({})
+        )
+        with timer as record:
+            frames = [df for df in inputs if isinstance(df, pl.DataFrame)]
+            if frames:
+                record['rows_in'] = sum(df.height for df in frames)
+            output = stage['func'](*inputs, **stage.get('kwargs', {}))
+            if checkpoint_dir and stage.get('checkpoint') and \
+                    isinstance(output, (pl.DataFrame, pl.LazyFrame)):
+                output = _checkpoint(checkpoint_dir, name, output)
+            if isinstance(output, pl.DataFrame):
+                record['rows_out'] = output.height
+        log(f"Stage {name} finished")
+        return output
+
+    outputs = {}
+    pending = list(order)
+    running = {}
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        while pending or running:
+            # Submit every stage whose inputs are finished
+            for name in list(pending):
+                deps = stages[name].get('inputs', [])
+                if all(dep in outputs for dep in deps):
+                    inputs = [outputs[dep] for dep in deps]
+                    running[pool.submit(run_stage, name, inputs)] = name
+                    pending.remove(name)
+
+            done, _ = wait(running, return_when = FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    outputs[name] = future.result()
+                except Exception:
+                    log(f"Stage {name} failed")
+                    # Let stages already running finish before raising
+                    wait(running)
+                    raise
+
+    if checkpoint_dir:
+        open(marker, 'w').close()
+    return outputs
+
+def _queue_connect(queue, timeout = 60):
+    """Open a job queue, creating the jobs table if needed.
+    
+    Shared filesystems (NFS, SMB) do not support WAL's shared memory, so
+    the queue uses a rollback journal, and waits up to timeout seconds on
+    locks held by other workers instead of failing.
+    """
+    conn = sqlite3.connect(queue, timeout = timeout, isolation_level = None)
+    conn.execute("PRAGMA journal_mode = DELETE")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        "file TEXT PRIMARY KEY, status TEXT NOT NULL DEFAULT 'pending', "
+        "attempts INTEGER NOT NULL DEFAULT 0, available_at REAL NOT NULL DEFAULT 0, "
+        "lease_until REAL, worker TEXT, output TEXT, error TEXT, updated REAL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, available_at)")
+    return conn
+
+def _job_input(file):
+    """Job names are paths, or archive::member for archive members."""
+    archive, sep, name = file.partition('::')
+    return ArchiveMember(archive, name) if sep else file
+
+def enqueue_files(queue, dir_paths):
+    """Add the input files of one or more directories to a job queue.
+    
+    The queue is a SQLite database with one row per file, which any number
+    of workers (see run_worker) can share, including from other machines
+    over a shared filesystem. Files are found as by extract_data, archives
+    contributing one job per member. Enqueuing is idempotent: files already
+    in the queue, in any state, are not added again.
+    
+    Args:
+        queue: Path to the SQLite job queue (created if needed)
+        dir_paths: Directory path, or list of directory paths
+    
+    Returns:
+        Number of jobs added
+    """
+    if isinstance(dir_paths, (str, os.PathLike)):
+        dir_paths = [dir_paths]
+
+    files = []
+    for dir_path in dir_paths:
+        inputs, archives = _glob_inputs(dir_path)
+        for key in inputs:
+            files += sorted(inputs[key])
+        for archive in archives:
+            files += [str(member) for member in archive_members(archive) if _input_kind(member)]
+
+    conn = _queue_connect(queue)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        before = conn.total_changes
+        conn.executemany(
+            "INSERT OR IGNORE INTO jobs (file, updated) VALUES (?, ?)",
+            [(file, time.time()) for file in files]
+        )
+        added = conn.total_changes - before
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return added
+
+def queue_status(queue):
+    """Return the number of jobs in each state ('pending', 'running', 'done',
+    'failed') of a job queue."""
+    conn = _queue_connect(queue)
+    try:
+        counts = dict(conn.execute("SELECT status, count(*) FROM jobs GROUP BY status"))
+    finally:
+        conn.close()
+    return {status: counts.get(status, 0) for status in ('pending', 'running', 'done', 'failed')}
+
+def _claim_job(conn, worker, lease, max_attempts):
+    """Atomically lease the next available job, or return None."""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Leases that ran out on their last attempt are not retried
+        conn.execute(
+            "UPDATE jobs SET status = 'failed', error = 'lease expired', updated = ? "
+            "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+            (now, now, max_attempts)
+        )
+        row = conn.execute(
+            "SELECT file FROM jobs WHERE (status = 'pending' AND available_at <= ?) "
+            "OR (status = 'running' AND lease_until < ?) "
+            "ORDER BY attempts, rowid LIMIT 1",
+            (now, now)
+        ).fetchone()
+        if row is not None:
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, lease_until = ?, "
+                "attempts = attempts + 1, updated = ? WHERE file = ?",
+                (worker, now + lease, now, row[0])
+            )
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+    return row[0] if row else None
+
+@contextlib.contextmanager
+def _heartbeat(queue, file, worker, lease):
+    """Renew a job's lease in the background while it is processed."""
+    stop = threading.Event()
+
+    def renew():
+        conn = _queue_connect(queue)
+        try:
+            while not stop.wait(lease / 3):
+                conn.execute(
+                    "UPDATE jobs SET lease_until = ? "
+                    "WHERE file = ? AND worker = ? AND status = 'running'",
+                    (time.time() + lease, file, worker)
+                )
+        finally:
+            conn.close()
+
+    thread = threading.Thread(target = renew, daemon = True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+def run_worker(queue, process, output_dir, worker_id = None, lease = 300,
+               max_attempts = 3, backoff = 5, poll = 1, wait = False):
+    """Claim, process and acknowledge jobs from a queue until it is drained.
+    
+    Each job is leased to this worker for lease seconds, renewed in the
+    background while it runs, so a crashed worker's job becomes available
+    again once its lease runs out. process(file) output is written as a
+    parquet shard in output_dir, then the job is acknowledged. A failed job
+    is retried after backoff * 2 ** (attempts - 1) seconds, up to
+    max_attempts attempts, after which it is marked failed.
+    
+    Leases are compared across machines by wall-clock time, so lease should
+    be well above any clock skew between workers.
+    
+    Args:
+        queue: Path to the SQLite job queue (see enqueue_files)
+        process: Function taking a file (path or ArchiveMember) and returning
+                 a polars.DataFrame or LazyFrame, e.g. extract_file followed
+                 by transforms
+        output_dir: Directory for shard outputs (shared by all workers)
+        worker_id: Name recorded on claimed jobs (default: host and pid)
+        lease: Lease duration in seconds
+        max_attempts: Attempts per job before it is marked failed
+        backoff: Base retry delay in seconds
+        poll: Seconds to sleep while jobs remain but none is available
+        wait: If True, keep polling for new jobs instead of returning once
+              no pending or running jobs remain
+    
+    Returns:
+        dict with the number of jobs this worker completed ('done'), saw fail
+        ('failed') and lost to an expired lease ('lost')
+        
+    Example:
+        plan = TransformPlan(types = schema, units = units)
+        run_worker(
+            "queue.db",
+            lambda file: plan(extract_file(file, schema = schema)),
+            "data/processed/shards"
+        )
+    """
+    worker = worker_id or f"{os.uname().nodename}:{os.getpid()}"
+    os.makedirs(output_dir, exist_ok = True)
+    counts = {'done': 0, 'failed': 0, 'lost': 0}
+
+    conn = _queue_connect(queue)
+    try:
+        while True:
+            file = _claim_job(conn, worker, lease, max_attempts)
+            if file is None:
+                status = queue_status(queue)
+                if not wait and not status['pending'] and not status['running']:
+                    return counts
+                time.sleep(poll)
+                continue
+
+            output = os.path.join(
+                output_dir, hashlib.sha256(file.encode()).hexdigest()[:32] + '.parquet'
+            )
+            try:
+                with _heartbeat(queue, file, worker, lease):
+                    tmp = f"{output}.{uuid.uuid4().hex}.tmp"
+                    write_data(tmp, process(_job_input(file)), format = 'parquet')
+                    os.replace(tmp, output)
+            except Exception as e:
+                attempts = conn.execute(
+                    "SELECT attempts FROM jobs WHERE file = ?", (file,)
+                ).fetchone()[0]
+                failed = attempts >= max_attempts
+                conn.execute(
+                    "UPDATE jobs SET status = ?, error = ?, available_at = ?, updated = ? "
+                    "WHERE file = ? AND worker = ? AND status = 'running'",
+                    (
+                        'failed' if failed else 'pending',
+                        repr(e),
+                        time.time() + backoff * 2 ** (attempts - 1),
+                        time.time(),
+                        file,
+                        worker
+                    )
+                )
+                if failed:
+                    counts['failed'] += 1
+                    warnings.warn(f"Job {file} failed after {attempts} attempts: {e!r}")
+                continue
+
+            # Acknowledge, unless the lease expired and the job moved on
+            acked = conn.execute(
+                "UPDATE jobs SET status = 'done', output = ?, error = NULL, updated = ? "
+                "WHERE file = ? AND worker = ? AND status = 'running'",
+                (output, time.time(), file, worker)
+            ).rowcount
+            counts['done' if acked else 'lost'] += 1
+    finally:
+        conn.close()
+
+def _worker_main(queue, process, output_dir, worker_id, options):
+    return run_worker(queue, process, output_dir, worker_id = worker_id, **options)
+
+def run_workers(queue, process, output_dir, workers = 4, **options):
+    """Run several run_worker processes on this machine and wait for them.
+    
+    Workers are started with the 'spawn' method (polars is not fork-safe),
+    so process must be picklable: a module-level function, or a
+    functools.partial of one, rather than a lambda.
+    
+    Args:
+        queue: Path to the SQLite job queue (see enqueue_files)
+        process: Picklable function, as for run_worker
+        output_dir: Directory for shard outputs
+        workers: Number of worker processes
+        **options: Other run_worker options (lease, max_attempts, ...)
+    
+    Returns:
+        dict of job counts summed over the workers, as from run_worker
+    """
+    import multiprocessing
+
+    host = os.uname().nodename
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers = workers, mp_context = context) as pool:
+        futures = [
+            pool.submit(_worker_main, queue, process, output_dir, f"{host}:{n}", options)
+            for n in range(workers)
+        ]
+        totals = {'done': 0, 'failed': 0, 'lost': 0}
+        for future in futures:
+            for key, value in future.result().items():
+                totals[key] += value
+    return totals
+
+def merge_shards(queue, how = 'diagonal_relaxed'):
+    """Lazily concatenate the shard outputs of all completed jobs.
+    
+    Shards are scanned in job order, so the result does not depend on which
+    worker processed which file. Write it with write_data (or load_sqlite,
+    load_duckdb, ...) to produce the final output.
+    
+    Args:
+        queue: Path to the SQLite job queue
+        how: pl.concat strategy; the default allows shards with differing
+             columns and upcasts differing types
+    
+    Returns:
+        polars.LazyFrame
+    """
+    conn = _queue_connect(queue)
+    try:
+        outputs = [
+            output for output, in conn.execute(
+                "SELECT output FROM jobs WHERE status = 'done' ORDER BY rowid"
+            )
+        ]
+    finally:
+        conn.close()
+
+    if not outputs:
+        return pl.LazyFrame()
+    return pl.concat([pl.scan_parquet(output) for output in outputs], how = how)
+
+# Bumped on every peak RSS reset, so a stage can tell whether a concurrent
+# stage reset the peak while it ran
+_rss_resets = 0
+_rss_lock = threading.Lock()
+
+def _peak_rss_mb():
+    """Peak resident set size of this process in MB (None if unavailable).
+    
+    On Linux this is VmHWM, which _reset_peak_rss resets; elsewhere it is
+    the peak since the process started.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+def _reset_peak_rss():
+    """Reset the peak RSS to the current RSS, where the OS allows it.
+    
+    Returns a token for _stage_peak_rss_mb, or None if the peak could not be
+    reset (anywhere but Linux).
+    """
+    global _rss_resets
+    with _rss_lock:
+        try:
+            # Linux: writing 5 to clear_refs resets VmHWM
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+        except OSError:
+            return None
+        _rss_resets += 1
+        return _rss_resets
+
+def _stage_peak_rss_mb(token):
+    """Peak RSS in MB since the reset that returned token, or None if there
+    was no reset or the peak was reset again since (by a concurrent stage)."""
+    with _rss_lock:
+        if token is None or token != _rss_resets:
+            return None
+        peak = _peak_rss_mb()
+    return round(peak, 1) if peak is not None else None
+
+class StageLogger:
+    """Structured JSON-lines progress log with per-stage timing.
+    
+    The log file is opened once and written through a buffered handle, with
+    one JSON record per line. Every record carries the run id and a
+    timestamp; stage records add wall and CPU time, peak RSS and any counts
+    set by the caller (rows_in, rows_out, bytes_read, ...). run_pipeline sets
+    rows_in and rows_out for stages taking and returning DataFrames.
+    
+    peak_rss_mb is the process's peak RSS while the stage ran, measured by
+    resetting the peak when the stage starts. It is None where the peak
+    cannot be reset (anywhere but Linux), and for a stage during which a
+    concurrent stage started and reset it.
+    
+    A StageLogger is also callable with a message, so it can be passed
+    wherever a log_progress-style function is expected.
+    
+    Example:
+        with StageLogger("logs/etl.jsonl") as logger:
+            logger("ETL job started")
+            with logger.stage("extract") as record:
+                df = extract_data("data/raw")
+                record['rows_out'] = df.height
+            print(logger.summary())
+    """
+
+    def __init__(self, file, run_id = None, buffer_size = 1 << 16):
+        self.file = file
+        self.run_id = run_id or time.strftime('%Y%m%dT%H%M%S-') + uuid.uuid4().hex[:8]
+        self.records = []
+        self._lock = threading.Lock()
+        self._handle = open(file, 'a', buffering = buffer_size)
+
+    def __call__(self, message, **fields):
+        self.log(message, **fields)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def log(self, message, **fields):
+        """Write a free-text record (with optional extra fields)."""
+        self._write({'event': 'message', 'message': message, **fields})
+
+    @contextlib.contextmanager
+    def stage(self, name, **fields):
+        """Time a block as a stage; the yielded dict is added to the record."""
+        record = dict(fields)
+        rss = _reset_peak_rss()
+        start, cpu = time.perf_counter(), time.process_time()
+        status = 'ok'
+        try:
+            yield record
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            self._write({
+                'event': 'stage',
+                'stage': name,
+                'status': status,
+                'wall_s': round(time.perf_counter() - start, 6),
+                'cpu_s': round(time.process_time() - cpu, 6),
+                'peak_rss_mb': _stage_peak_rss_mb(rss),
+                **record
+            })
+
+    def summary(self):
+        """Return this run's stage records as a polars.DataFrame."""
+        stages = [r for r in self.records if r['event'] == 'stage']
+        return pl.DataFrame(stages, infer_schema_length = None) if stages else pl.DataFrame()
+
+    def flush(self):
+        with self._lock:
+            self._handle.flush()
+
+    def close(self):
+        with self._lock:
+            if not self._handle.closed:
+                self._handle.close()
+
+    def _write(self, record):
+        record = {
+            'run_id': self.run_id,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            **record
+        }
+        line = json.dumps(record, default = str)
+        with self._lock:
+            self.records.append(record)
+            self._handle.write(line + '\n')
+
+def summarize_log(file, run_id = None):
+    """Summarize stage records of a StageLogger file per run and stage.
+    
+    Args:
+        file: Path to a JSON-lines log written by StageLogger
+        run_id: Only summarize this run (optional, default all runs)
+    
+    Returns:
+        polars.DataFrame with one row per run and stage: call count, total
+        and max wall time, total CPU time, peak RSS and summed row counts
+    """
+    records = pl.read_ndjson(file, infer_schema_length = None)
+    if 'stage' not in records.columns:
+        return pl.DataFrame()
+    stages = records.filter(pl.col('event') == 'stage')
+    if run_id is not None:
+        stages = stages.filter(pl.col('run_id') == run_id)
+
+    counts = [
+        pl.col(col).sum() for col in ('rows_in', 'rows_out', 'bytes_read')
+        if col in stages.columns
+    ]
+    return (
+        stages
+        .group_by('run_id', 'stage', maintain_order = True)
+        .agg(
+            pl.len().alias('calls'),
+            pl.col('wall_s').sum(),
+            pl.col('wall_s').max().alias('max_wall_s'),
+            pl.col('cpu_s').sum(),
+            pl.col('peak_rss_mb').max(),
+            (pl.col('status') == 'error').sum().alias('errors'),
+            *counts
+        )
+        .sort('run_id', 'wall_s', descending = [False, True])
+    )
+
+# Active profiler state (None when profiling is off)
+_profile = None
+
+class _Profile:
+    """Call statistics collected by profile()."""
+
+    def __init__(self, plans = True):
+        self.plans = plans
+        self.stats = {}
+        self.query_plans = {}
+        self.lock = threading.Lock()
+
+    def record(self, name, wall, cpu, alloc):
+        with self.lock:
+            stat = self.stats.setdefault(name, {
+                'calls': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'alloc_bytes': 0
+            })
+            stat['calls'] += 1
+            stat['wall_s'] += wall
+            stat['cpu_s'] += cpu
+            stat['alloc_bytes'] += alloc
+
+    def record_plan(self, name, output):
+        if not self.plans or not isinstance(output, pl.LazyFrame):
+            return
+        if name in self.query_plans:
+            # Only the first plan is kept; skip the explain()
+            return
+        try:
+            plan = output.explain()
+        except Exception as e:
+            plan = f"<explain failed: {e!r}>"
+        with self.lock:
+            self.query_plans.setdefault(name, plan)
+
+    def report(self):
+        """Return the statistics as a JSON-serializable, stably ordered dict."""
+        return {
+            'functions': {
+                name: {
+                    **stat,
+                    'wall_s': round(stat['wall_s'], 6),
+                    'cpu_s': round(stat['cpu_s'], 6)
+                }
+                for name, stat in sorted(self.stats.items())
+            },
+            'plans': dict(sorted(self.query_plans.items()))
+        }
+
+@contextlib.contextmanager
+def _span(name):
+    """Time a block as `name` when profiling is on; no-op otherwise."""
+    profiler = _profile
+    if profiler is None:
+        yield
+        return
+    start, cpu = time.perf_counter(), time.process_time()
+    before = tracemalloc.get_traced_memory()[0]
+    try:
+        yield
+    finally:
+        profiler.record(
+            name,
+            time.perf_counter() - start,
+            time.process_time() - cpu,
+            tracemalloc.get_traced_memory()[0] - before
+        )
+
+def _profiled(name, func):
+    """Wrap func so each call is recorded by the active profiler."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _span(name):
+            output = func(*args, **kwargs)
+        if _profile is not None:
+            _profile.record_plan(name, output)
+        return output
+    wrapper.__wrapped_by_profile__ = True
+    return wrapper
+
+def _public_functions():
+    module = sys.modules[__name__]
+    return {
+        name: obj for name, obj in vars(module).items()
+        if not name.startswith('_')
+        and callable(obj)
+        and not isinstance(obj, type)
+        and getattr(obj, '__module__', None) == __name__
+        and name not in ('profile', 'get_registry')
+    }
+
+@contextlib.contextmanager
+def profile(file = None, plans = True):
+    """Profile the public functions of this module within a block.
+    
+    While active, every public function (extract_*, transform_*,
+    write_data, ...) is wrapped to record call counts, cumulative wall and
+    CPU time and net Python allocations (via tracemalloc; memory allocated
+    by polars itself is not visible to tracemalloc). extract_data also
+    records its glob, read and concat phases separately. With plans, the
+    optimized query plan (LazyFrame.explain) of the first LazyFrame returned
+    by each function is kept.
+    
+    Functions are wrapped by replacing the module's attributes, so only
+    calls through the module (de.extract_data) are recorded. Names bound
+    earlier with "from src.pyproj4de import extract_data" still refer to
+    the unwrapped functions and are not profiled.
+    
+    Setting the PYPROJ4DE_PROFILE environment variable to a file path
+    profiles the whole process and writes the report there at exit. The
+    functions are then wrapped as the module is imported, so names imported
+    from it are profiled too.
+    
+    Args:
+        file: Path to write the JSON report to on exit (optional). Keys are
+              sorted so reports from different runs can be diffed.
+        plans: If True, capture query plans of returned LazyFrames
+    
+    Yields:
+        The profiler; its report() method returns the collected statistics
+        
+    Example:
+        from src import pyproj4de as de
+
+        with de.profile("profile.json") as prof:
+            df = de.extract_data("data/raw")
+            df = de.transform_type(df, schema)
+        print(prof.report()['functions']['extract_data'])
+    """
+    global _profile
+    if _profile is not None:
+        raise RuntimeError("profile() is already active")
+
+    module = sys.modules[__name__]
+    originals = _public_functions()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+
+    profiler = _Profile(plans = plans)
+    _profile = profiler
+    for name, func in originals.items():
+        setattr(module, name, _profiled(name, func))
+    try:
+        yield profiler
+    finally:
+        for name, func in originals.items():
+            setattr(module, name, func)
+        _profile = None
+        if started_tracing:
+            tracemalloc.stop()
+        if file:
+            with open(file, 'w') as f:
+                json.dump(profiler.report(), f, indent = 2)
+
+def _is_ibis(data):
+    """True for ibis expressions, without importing ibis."""
+    return type(data).__module__.startswith('ibis.')
+
+def duckdb_connect(database = ':memory:', memory_limit = None,
+                   temp_directory = None, threads = None):
+    """Connect an ibis DuckDB backend for out-of-core transforms.
+    
+    DuckDB spills to temp_directory once memory_limit is reached, so
+    transforms on inputs larger than memory still complete.
+    
+    Args:
+        database: DuckDB database file, or ':memory:'
+        memory_limit: DuckDB memory limit, e.g. '12GB' (optional)
+        temp_directory: Directory DuckDB spills to (optional)
+        threads: Number of DuckDB threads (optional)
+    
+    Returns:
+        ibis DuckDB backend
+    """
+    import ibis
+
+    config = {
+        key: value for key, value in {
+            'memory_limit': memory_limit,
+            'temp_directory': temp_directory,
+            'threads': threads
+        }.items() if value is not None
+    }
+    return ibis.duckdb.connect(database, **config)
+
+def extract_duckdb(con, dir_path, columns = None, options = None):
+    """Extract CSV and JSON files in a directory as one ibis table.
+    
+    Mirrors extract_data: every column is read as a string, so the same
+    transform_type/transform_unit specification can be applied, and nothing
+    is read until the result is executed. XML is not supported by DuckDB and
+    is not read here.
+    
+    Args:
+        con: ibis DuckDB backend (see duckdb_connect)
+        dir_path: Path to directory containing files
+        columns: List of columns to extract (optional)
+        options: Dict with optional keys:
+            - csv: Dict of options for con.read_csv
+            - json: Dict of options for con.read_json
+    
+    Returns:
+        ibis table expression
+    """
+    import ibis
+
+    options = options or {}
+    tables = []
+
+    csv_files = sorted(glob.glob(os.path.join(dir_path, "*.csv")))
+    if csv_files:
+        tables.append(con.read_csv(
+            csv_files,
+            all_varchar = True,
+            **options.get('csv', {})
+        ))
+
+    json_files = sorted(glob.glob(os.path.join(dir_path, "*.json")))
+    if json_files:
+        t = con.read_json(json_files, **options.get('json', {}))
+        tables.append(t.select([t[col].cast('string').name(col) for col in t.columns]))
+
+    if not tables:
+        raise FileNotFoundError(f"No CSV or JSON files in {dir_path}")
+
+    columns = columns or tables[0].columns
+    tables = [t.select(columns) for t in tables]
+    return ibis.union(*tables, distinct = False) if len(tables) > 1 else tables[0]
+
+# Text polars' non-strict casts accept; DuckDB's TRY_CAST is more lenient
+# (whitespace, underscores, and for integers decimals and exponents)
+_ibis_integer_text = r'^[+-]?[0-9]+$'
+_ibis_float_text = r'^[^\s_]*$'
+
+def _ibis_try_cast(value, to):
+    """try_cast matching polars cast(strict = False); invalid values are null."""
+    import ibis
+
+    source = value.type()
+    if source.is_string() and (to.is_integer() or to.is_floating()):
+        pattern = _ibis_integer_text if to.is_integer() else _ibis_float_text
+        return ibis.ifelse(value.re_search(pattern), value.try_cast(to), ibis.null(to))
+    if source.is_floating() and to.is_integer():
+        # polars truncates toward zero; DuckDB rounds
+        return (value - value % 1).try_cast(to)
+    return value.try_cast(to)
+
+def _ibis_transform_type(table, schema):
+    """transform_type for ibis tables; invalid values become null."""
+    from ibis.formats.polars import PolarsType
+
+    return table.select([
+        _ibis_try_cast(table[col], PolarsType.to_ibis(schema[col])).name(col)
+        if col in schema else table[col]
+        for col in table.columns
+    ])
+
+def _ibis_transform_unit(table, conversions):
+    """transform_unit for ibis tables, including per-row unit columns."""
+    import ibis
+
+    expressions = []
+    for col in table.columns:
+        if col not in conversions:
+            expressions.append(table[col])
+            continue
+
+        from_unit, to_unit = conversions[col]
+        if not isinstance(from_unit, pl.Expr):
+            scale, offset = unit_factors(from_unit, to_unit)
+            expr = table[col] * scale
+            expr = expr + offset if offset else expr
+            if table[col].type().is_floating():
+                # Keep the column's float width, as polars does
+                expr = expr.cast(table[col].type())
+            expressions.append(expr.name(col))
+            continue
+
+        # Per-row units: join a small lookup table of (scale, offset) pairs
+        unit_column = from_unit.meta.output_name()
+        units = table.select(unit_column).distinct().to_polars()
+        lookup = ibis.memtable(
+            _unit_table(units, col, unit_column, to_unit).to_arrow()
+        )
+        table = table.left_join(lookup, unit_column).drop(f"{unit_column}_right")
+        expressions.append(
+            (table[col] * table[f"__scale_{col}"] + table[f"__offset_{col}"]).name(col)
+        )
+
+    return table.select(expressions)
+
+def _ibis_transform_currency(table, rates, columns, currencies, options):
+    """transform_currency for ibis tables: one literal multiply per currency."""
+    currency_col = options.get('currency', 'Currency')
+    rate_col = options.get('rate', 'Rate')
+    name = options.get('name', '{column}_{currency}')
+    decimals = options.get('round')
+
+    rates = rates.lazy().collect()
+    if currencies is None:
+        currencies = rates[currency_col].unique(maintain_order = True).to_list()
+    else:
+        rates = rates.filter(pl.col(currency_col).is_in(currencies))
+        missing = set(currencies) - set(rates[currency_col])
+        if missing:
+            raise ValueError(f"No rates for currencies: {sorted(missing)}")
+    lookup = dict(zip(rates[currency_col], rates[rate_col].cast(pl.Float64)))
+
+    converted = []
+    for col in columns:
+        for currency in currencies:
+            expr = table[col] * lookup[currency]
+            if decimals is not None:
+                expr = expr.round(decimals)
+            converted.append(expr.name(name.format(column = col, currency = currency)))
+    return table.mutate(converted)
+
+@contextlib.contextmanager
+def _duckdb_connection(database):
+    """A raw DuckDB connection for a path, duckdb connection or ibis backend.
+    
+    Connections opened here from a path are closed on exit; ones passed in
+    are left open.
+    """
+    if isinstance(database, (str, os.PathLike)):
+        import duckdb
+
+        conn = duckdb.connect(str(database))
+        try:
+            yield conn
+        finally:
+            conn.close()
+    else:
+        # ibis DuckDB backends wrap the raw connection
+        yield getattr(database, 'con', database)
+
+def _arrow_stream(data, batch_size):
+    """Expose a polars frame to DuckDB as Arrow without copying it.
+    
+    A DataFrame's buffers are shared as an Arrow table; a LazyFrame is
+    executed in batches behind a RecordBatchReader, so DuckDB consumes it as
+    a stream and the whole result is never held in memory.
+    """
+    import pyarrow as pa
+
+    if isinstance(data, pl.DataFrame):
+        return data.to_arrow()
+    schema = pl.DataFrame(schema = data.collect_schema()).to_arrow().schema
+    batches = (
+        record_batch
+        for batch in _iter_batches(data, batch_size)
+        for record_batch in batch.to_arrow().to_batches()
+    )
+    return pa.RecordBatchReader.from_batches(schema, batches)
+
+def load_duckdb(database, table, data, mode = 'append', partition_by = None,
+                batch_size = 100_000):
+    """Load data into a DuckDB table through Arrow.
+    
+    Frames are handed to DuckDB as Arrow data (zero-copy for a DataFrame,
+    a batched Arrow stream for a LazyFrame) and inserted with a single
+    INSERT ... SELECT, so rows are never converted one by one. The load runs
+    in one transaction.
+    
+    Args:
+        database: DuckDB database file, duckdb connection or ibis DuckDB
+                  backend (see duckdb_connect)
+        table: Name of the table to load into
+        data: polars.DataFrame or polars.LazyFrame to load
+        mode: 'append' (create the table if needed and insert) or 'replace'
+              (drop and recreate the table, or with partition_by, replace
+              only the partitions present in data)
+        partition_by: List of partition columns (optional). Rows are
+                      inserted sorted on them, so each partition occupies
+                      its own row groups and DuckDB's min/max indexes skip
+                      the others when queries filter on them.
+        batch_size: Rows per Arrow batch when streaming a LazyFrame
+    
+    Returns:
+        Number of rows loaded
+        
+    Example:
+        load_duckdb("warehouse.duckdb", "Largest_banks", df, mode = "replace")
+
+        # Overwrite only the years in df
+        load_duckdb("warehouse.duckdb", "sales", df, mode = "replace",
+                    partition_by = ["year"])
+    """
+    if mode not in ('append', 'replace'):
+        raise ValueError(f"Unsupported mode: {mode!r}")
+
+    source = f"__load_{uuid.uuid4().hex}"
+    select = f"SELECT * FROM {_quote(source)}"
+    if partition_by:
+        select += f" ORDER BY {', '.join(_quote(col) for col in partition_by)}"
+
+    with _duckdb_connection(database) as conn:
+        conn.register(source, _arrow_stream(data, batch_size))
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                if mode == 'replace' and not partition_by:
+                    statement = f"CREATE OR REPLACE TABLE {_quote(table)} AS {select}"
+                else:
+                    conn.execute(
+                        f"CREATE TABLE IF NOT EXISTS {_quote(table)} AS "
+                        f"SELECT * FROM {_quote(source)} LIMIT 0"
+                    )
+                    if mode == 'replace':
+                        # A stream can only be read once: stage it, then swap
+                        # out the partitions it covers
+                        staged = f"{source}_staged"
+                        conn.execute(f"CREATE TEMP TABLE {_quote(staged)} AS {select}")
+                        keys = ", ".join(_quote(col) for col in partition_by)
+                        conn.execute(
+                            f"DELETE FROM {_quote(table)} WHERE ({keys}) IN "
+                            f"(SELECT DISTINCT {keys} FROM {_quote(staged)})"
+                        )
+                        select = f"SELECT * FROM {_quote(staged)}"
+                    statement = f"INSERT INTO {_quote(table)} BY NAME {select}"
+                # DuckDB reports the number of rows written
+                n_rows = conn.execute(statement).fetchone()[0]
+                if mode == 'replace' and partition_by:
+                    conn.execute(f"DROP TABLE {_quote(staged)}")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.unregister(source)
+    return n_rows
+
+def query_duckdb(database, query, params = None):
+    """Run a (parameterized) query on DuckDB and return a polars DataFrame.
+    
+    The result is transferred as Arrow, with no row-wise conversion.
+    
+    Args:
+        database: DuckDB database file, duckdb connection or ibis DuckDB
+                  backend (see duckdb_connect)
+        query: SQL text, with ? or $name placeholders for params
+        params: Sequence or dict of query parameters (optional)
+    
+    Returns:
+        polars.DataFrame with the query result
+        
+    Example:
+        query_duckdb("warehouse.duckdb", "SELECT AVG(MC_GBP_Billion) FROM Largest_banks")
+    """
+    with _duckdb_connection(database) as conn:
+        return conn.execute(query, params).pl()
+
+# Last, so every public function above is wrapped
+if os.environ.get('PYPROJ4DE_PROFILE'):
+    _env_profile = profile(os.environ['PYPROJ4DE_PROFILE'])
+    _env_profile.__enter__()
+    atexit.register(_env_profile.__exit__, None, None, None)
@@ -0,0 +1,5 @@
+# Make `from src import pyproj4de` work when pytest runs from the repo root
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
@@ -0,0 +1,19 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src import pyproj4de as de
+
+rates = pl.DataFrame({'Currency': ['GBP', 'EUR'], 'Rate': [0.8, 0.93]})
+df = pl.DataFrame({'usd': [10.0, 20.0]})
+
+def test_lazy_rates_match_eager_rates():
+    for data in (df, df.lazy()):
+        eager = de.transform_currency(data, rates, ['usd'], ['EUR', 'GBP'])
+        lazy = de.transform_currency(data, rates.lazy(), ['usd'], ['EUR', 'GBP'])
+        assert_frame_equal(lazy.lazy().collect(), eager.lazy().collect())
+
+def test_missing_currency_raises_for_lazy_rates():
+    for table in (rates, rates.lazy()):
+        with pytest.raises(ValueError, match = "JPY"):
+            de.transform_currency(df, table, ['usd'], ['EUR', 'JPY'])
@@ -0,0 +1,33 @@
+import polars as pl
+import pytest
+
+from src import pyproj4de as de
+
+def test_dedup_across_frames_and_runs(tmp_path):
+    file = str(tmp_path / "seen.parquet")
+    index = de.DedupIndex(file = file)
+    first = index.filter(pl.DataFrame({'a': [1, 2, 1], 'b': ['x', 'y', 'x']}))
+    # Same rows, columns in another order
+    second = index.filter(pl.DataFrame({'b': ['y', 'z'], 'a': [2, 3]}))
+    assert first.to_dicts() == [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}]
+    assert second.to_dicts() == [{'b': 'z', 'a': 3}]
+    index.save()
+
+    index = de.DedupIndex(file = file)
+    assert len(index) == 3
+    lazy = index.filter(pl.LazyFrame({'a': [3, 4], 'b': ['z', 'w']}))
+    assert lazy.collect().to_dicts() == [{'a': 4, 'b': 'w'}]
+
+def test_dedup_key_mismatch(tmp_path):
+    file = str(tmp_path / "seen.parquet")
+    index = de.DedupIndex(key = ['a'])
+    index.filter(pl.DataFrame({'a': [1]}))
+    index.save(file)
+    with pytest.raises(ValueError):
+        de.DedupIndex(key = ['b'], file = file)
+
+def test_extract_data_dedup(tmp_path):
+    pl.DataFrame({'name': ['a', 'b'], 'v': ['1.0', '2.0']}).write_csv(tmp_path / "x.csv")
+    pl.DataFrame({'name': ['b', 'c'], 'v': [2.0, 3.0]}).write_ndjson(tmp_path / "x.json")
+    df = de.extract_data(str(tmp_path), schema = {'v': pl.Float64}, dedup = de.DedupIndex())
+    assert df['name'].to_list() == ['a', 'b', 'c']
@@ -0,0 +1,78 @@
+import polars as pl
+import pytest
+from polars.testing import assert_frame_equal
+
+from src import pyproj4de as de
+
+ibis = pytest.importorskip("ibis")
+
+# Clean and messy text, as read from CSV with every column a string
+text = [
+    '1', '+3', '-2', '007', '-0', ' 3 ', '1.5', '-0.5', '1e3', '1E-2', '.5', '1.',
+    '0x10', '1_000', '', 'abc', '99999999999999999999', 'inf', '-inf', 'nan',
+    ' 1.5 ', '+1.5', None
+]
+floats = [1.5, -0.5, 2.7, -2.7, 0.0, float('nan'), float('inf'), 1e30, None]
+
+@pytest.fixture
+def con():
+    return de.duckdb_connect()
+
+def both(con, df, transform):
+    """Run transform on polars and on DuckDB, returning both results."""
+    table = con.create_table('t', df, overwrite = True)
+    return transform(df), transform(table).to_polars()
+
+@pytest.mark.parametrize('dtype', [pl.Int64, pl.Int32, pl.Float64, pl.Float32])
+def test_transform_type_text_parity(con, dtype):
+    df = pl.DataFrame({'v': text}, schema = {'v': pl.String})
+    expected, result = both(con, df, lambda d: de.transform_type(d, schema = {'v': dtype}))
+    assert_frame_equal(result, expected)
+
+@pytest.mark.parametrize('dtype', [pl.Int64, pl.Int32])
+def test_transform_type_float_to_int_parity(con, dtype):
+    df = pl.DataFrame({'v': floats}, schema = {'v': pl.Float64})
+    expected, result = both(con, df, lambda d: de.transform_type(d, schema = {'v': dtype}))
+    assert_frame_equal(result, expected)
+
+def test_transform_unit_parity(con):
+    df = pl.DataFrame({
+        'height': [64.0, 72.0, None],
+        'temp': [20.0, 68.0, 300.0],
+        'temp_unit': ['degC', 'degF', 'kelvin']
+    })
+    conversions = {
+        'height': ('inch', 'meter'),
+        'temp': (pl.col('temp_unit'), 'kelvin')
+    }
+    expected, result = both(con, df, lambda d: de.transform_unit(d, conversions = conversions))
+    assert_frame_equal(
+        result.sort('temp_unit'),
+        expected.sort('temp_unit'),
+        check_row_order = False
+    )
+
+def test_extract_duckdb_matches_extract_data(con, tmp_path):
+    pl.DataFrame({'name': ['a', 'b'], 'height': ['64', 'x']}).write_csv(tmp_path / "a.csv")
+    pl.DataFrame({'name': ['c'], 'height': ['70.5']}).write_ndjson(tmp_path / "b.json")
+    schema = {'height': pl.Float64}
+    expected = de.transform_type(de.extract_data(str(tmp_path)), schema = schema)
+    result = de.transform_type(de.extract_duckdb(con, str(tmp_path)), schema = schema).to_polars()
+    assert_frame_equal(result.sort('name'), expected.sort('name'))
+
+def test_transform_currency_parity(con):
+    df = pl.DataFrame({'Name': ['a', 'b', 'c'], 'MC_USD_Billion': [100.0, 2.5, None]})
+    rates = pl.DataFrame({'Currency': ['GBP', 'EUR', 'INR'], 'Rate': [0.8, 0.93, 82.95]})
+    options = {'name': 'MC_{currency}_Billion', 'round': 2}
+    expected, result = both(con, df, lambda d: de.transform_currency(
+        d, rates, ['MC_USD_Billion'], ['GBP', 'INR'], options = options
+    ))
+    assert_frame_equal(result, expected, check_row_order = False)
+
+def test_ibis_unsupported_transforms_raise(con):
+    table = con.create_table('t', pl.DataFrame({'amount': [1.0]}), overwrite = True)
+    rates = pl.DataFrame({'Currency': ['EUR'], 'Rate': [0.9], 'date': [None]})
+    with pytest.raises(TypeError, match = "Dated rates"):
+        de.transform_currency(table, rates, ['amount'], options = {'date': 'date'})
+    with pytest.raises(TypeError, match = "TransformPlan"):
+        de.TransformPlan(types = {'amount': pl.Float32})(table)
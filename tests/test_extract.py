@@ -0,0 +1,70 @@
+import os
+
+import polars as pl
+from polars.testing import assert_frame_equal
+
+from src import pyproj4de as de
+
+schema = {'price': pl.Float64, 'qty': pl.Int64}
+expected = pl.DataFrame(
+    {'name': ['a', 'b', 'c'], 'price': [1.5, None, 2.5], 'qty': [1, 2, None]},
+    schema = {'name': pl.String, 'price': pl.Float64, 'qty': pl.Int64}
+)
+
+def write_dirty(dir_path, kind):
+    # One unparseable value per typed column
+    file = dir_path / f"data.{kind}"
+    if kind == 'csv':
+        file.write_text("name,price,qty\na,1.5,1\nb,n/a,2\nc,2.5,x\n")
+    elif kind == 'json':
+        file.write_text(
+            '{"name": "a", "price": "1.5", "qty": "1"}\n'
+            '{"name": "b", "price": "n/a", "qty": "2"}\n'
+            '{"name": "c", "price": "2.5", "qty": "x"}\n'
+        )
+    else:
+        file.write_text(
+            "<data><r><name>a</name><price>1.5</price><qty>1</qty></r>"
+            "<r><name>b</name><price>n/a</price><qty>2</qty></r>"
+            "<r><name>c</name><price>2.5</price><qty>x</qty></r></data>"
+        )
+    return file
+
+def test_typed_extract_casts_dirty_values_to_null(tmp_path):
+    for kind in ('csv', 'json', 'xml'):
+        (tmp_path / kind).mkdir()
+        write_dirty(tmp_path / kind, kind)
+        for lazy in (False, True):
+            df = de.extract_data(tmp_path / kind, schema = schema, lazy = lazy)
+            assert_frame_equal(df.lazy().collect(), expected)
+
+def test_manifest_reads_only_new_and_changed_files(tmp_path, monkeypatch):
+    data_dir = tmp_path / "landing"
+    data_dir.mkdir()
+    (data_dir / "a.csv").write_text("name,qty\na,1\n")
+    (data_dir / "b.csv").write_text("name,qty\nb,2\n")
+    manifest = {}
+    assert de.extract_data(data_dir, manifest = manifest).height == 2
+    file = str(tmp_path / "manifest.json")
+    de.save_manifest(file, manifest)
+    manifest = de.load_manifest(file)
+
+    # Rerun: nothing is read, and nothing is hashed
+    hashed = []
+    fingerprint = de.file_fingerprint
+    monkeypatch.setattr(de, 'file_fingerprint', lambda f: hashed.append(f) or fingerprint(f))
+    assert de.extract_data(data_dir, manifest = manifest).is_empty()
+    assert hashed == []
+
+    # Touched but unchanged: hashed, skipped, and its new mtime recorded
+    a = data_dir / "a.csv"
+    stat = a.stat()
+    os.utime(a, (stat.st_atime, stat.st_mtime + 10))
+    assert de.extract_data(data_dir, manifest = manifest).is_empty()
+    assert len(hashed) == 1
+    assert manifest[str(a)]['mtime'] == stat.st_mtime + 10
+
+    # A new file is read
+    (data_dir / "c.csv").write_text("name,qty\nc,3\n")
+    assert de.extract_data(data_dir, manifest = manifest)['name'].to_list() == ['c']
+    assert de.extract_data(data_dir, manifest = manifest).is_empty()
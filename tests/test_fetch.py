@@ -0,0 +1,80 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from src import pyproj4de as de
+
+pytest.importorskip("requests")
+
+class Handler(BaseHTTPRequestHandler):
+    """Local stand-in for a scraped site."""
+
+    def do_GET(self):
+        server = self.server
+        server.hits[self.path] = server.hits.get(self.path, 0) + 1
+        if self.path == '/flaky' and server.hits[self.path] == 1:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.headers.get('If-None-Match') == server.etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        body = server.body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', server.etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.hits, httpd.etag, httpd.body = {}, '"v1"', "<p>hello</p>"
+    thread = threading.Thread(target = httpd.serve_forever, daemon = True)
+    thread.start()
+    httpd.url = f"http://127.0.0.1:{httpd.server_port}"
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+def test_fetch_fills_cache_and_revalidates(server, tmp_path):
+    url = server.url + "/page"
+    assert de.fetch_url(url, cache_dir = tmp_path) == "<p>hello</p>"
+    assert len(list((tmp_path / "objects").iterdir())) == 1
+
+    # Unchanged: a 304 answered from the cache
+    server.body = "<p>changed, but the ETag says otherwise</p>"
+    assert de.fetch_url(url, cache_dir = tmp_path) == "<p>hello</p>"
+    assert server.hits["/page"] == 2
+
+    # Changed: new ETag, new body
+    server.etag = '"v2"'
+    assert de.fetch_url(url, cache_dir = tmp_path) == server.body
+
+def test_fetch_retries_server_errors(server):
+    assert de.fetch_url(server.url + "/flaky", backoff = 0) == "<p>hello</p>"
+    assert server.hits["/flaky"] == 2
+
+def test_fetch_max_age_skips_network(server, tmp_path):
+    url = server.url + "/page"
+    de.fetch_url(url, cache_dir = tmp_path)
+    assert de.fetch_url(url, cache_dir = tmp_path, max_age = 3600) == "<p>hello</p>"
+    assert server.hits["/page"] == 1
+
+def test_fetch_closes_its_own_session(server, monkeypatch):
+    sessions = []
+    make_session = de.make_session
+    def tracked(*args, **kwargs):
+        session = make_session(*args, **kwargs)
+        close = session.close
+        session.close = lambda: (sessions.append(session), close())
+        return session
+    monkeypatch.setattr(de, 'make_session', tracked)
+    de.fetch_url(server.url + "/page")
+    assert len(sessions) == 1
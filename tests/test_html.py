@@ -0,0 +1,34 @@
+import polars as pl
+
+from src import pyproj4de as de
+
+html = """
+<table><tbody><tr><td>navigation</td></tr></tbody></table>
+<table><tbody>
+  <tr class='static-row-header'><th>Rank</th><th>Name</th><th>Value</th></tr>
+  <tr><td>1</td><td><a href='/a'>A &amp; B</a><sup>[1]</sup></td><td> 1,000.5 </td></tr>
+  <tr><td rowspan="2">2</td><td>C</td><td colspan="1">7</td></tr>
+  <tr><td>D</td><td>8</td></tr>
+</tbody></table>
+"""
+
+def test_extract_html_table_cells():
+    df = de.extract_html_table(html, 1, ['Rank', 'Name', 'Value'], options = {'cells': ('td',)})
+    assert df.columns == ['Rank', 'Name', 'Value']
+    assert df['Name'].to_list() == ['A & B[1]', 'C', 'D']
+    # rowspan repeats the cell into the next row
+    assert df['Rank'].to_list() == ['1', '2', '2']
+
+def test_extract_html_table_while_profiling():
+    # Profiling wraps helpers; cell spans must still parse as integers
+    with de.profile():
+        df = de.extract_html_table(html, 1, ['Rank', 'Name', 'Value'], options = {'cells': ('td',)})
+    assert df.height == 3
+    assert isinstance(df, pl.DataFrame)
+
+def test_extract_html_table_unclosed_rows():
+    # </tr>, </th> and </td> may all be omitted
+    page = "<table><tbody><tr><th>a<th>b<tr><td>1<td>2<tr><td>3<td>4</tbody></table>"
+    df = de.extract_html_table(page)
+    assert df.columns == ['a', 'b']
+    assert df.rows() == [('1', '2'), ('3', '4')]
@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Optional dependencies, imported on first use only
+lazy_modules = ['pint', 'ibis', 'duckdb', 'pyarrow', 'bs4', 'pandas', 'sqlalchemy', 'requests']
+
+# Import time of the module itself, excluding polars (pint alone is ~0.2 s)
+budget_s = 0.2
+
+def run(code, *flags):
+    return subprocess.run(
+        [sys.executable, *flags, '-c', code],
+        cwd = root,
+        check = True,
+        capture_output = True,
+        text = True
+    )
+
+def test_import_does_not_load_optional_dependencies():
+    out = run(
+        "import sys; from src import pyproj4de; "
+        f"print(','.join(m for m in {lazy_modules!r} if m in sys.modules))"
+    )
+    assert out.stdout.strip() == ""
+
+def import_time_s():
+    # -X importtime reports cumulative microseconds per module on stderr
+    times = {}
+    for line in run("from src import pyproj4de", '-X', 'importtime').stderr.splitlines():
+        if line.startswith('import time:') and '|' in line:
+            _, cumulative, name = line.split('|')
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative)
+    return (times['src.pyproj4de'] - times.get('polars', 0)) / 1e6
+
+def test_import_time_budget():
+    # Best of three, to keep scheduler noise out of the check
+    assert min(import_time_s() for _ in range(3)) < budget_s
@@ -0,0 +1,69 @@
+import json
+
+import polars as pl
+import pytest
+
+from src import pyproj4de as de
+
+def read_records(file):
+    with open(file) as f:
+        return [json.loads(line) for line in f]
+
+def test_stage_records_and_summary(tmp_path):
+    file = str(tmp_path / "log.jsonl")
+    with de.StageLogger(file, run_id = "run1") as logger:
+        logger("started")
+        with logger.stage("extract") as record:
+            record['rows_out'] = 3
+        with pytest.raises(RuntimeError):
+            with logger.stage("load"):
+                raise RuntimeError("load failed")
+
+    records = read_records(file)
+    assert [r['event'] for r in records] == ['message', 'stage', 'stage']
+    assert all(r['run_id'] == "run1" for r in records)
+    extract, load = records[1:]
+    assert (extract['stage'], extract['status'], extract['rows_out']) == ("extract", "ok", 3)
+    assert load['status'] == "error"
+    assert extract['wall_s'] >= 0 and extract['cpu_s'] >= 0
+
+def test_peak_rss_is_per_stage(tmp_path):
+    if de._reset_peak_rss() is None:
+        pytest.skip("peak RSS cannot be reset on this platform")
+    with de.StageLogger(str(tmp_path / "log.jsonl")) as logger:
+        with logger.stage("heavy"):
+            block = bytearray(200 << 20)
+            block[::4096] = b'x' * len(block[::4096])
+            del block
+        with logger.stage("light"):
+            pass
+    heavy, light = logger.summary()['peak_rss_mb'].to_list()
+    assert heavy - light > 150
+
+def test_summarize_log_per_run_and_stage(tmp_path):
+    file = str(tmp_path / "log.jsonl")
+    for run_id, rows in (("run1", [2, 3]), ("run2", [5])):
+        with de.StageLogger(file, run_id = run_id) as logger:
+            for n in rows:
+                with logger.stage("extract") as record:
+                    record['rows_out'] = n
+
+    summary = de.summarize_log(file)
+    assert summary.select('run_id', 'stage', 'calls', 'rows_out').rows() == [
+        ("run1", "extract", 2, 5),
+        ("run2", "extract", 1, 5)
+    ]
+    assert de.summarize_log(file, run_id = "run2")['calls'].to_list() == [1]
+
+def test_run_pipeline_logs_row_counts(tmp_path):
+    stages = {
+        'extract': {'func': lambda: pl.DataFrame({'a': [1, 2, 3]})},
+        'filter': {'func': lambda df: df.filter(pl.col('a') > 1), 'inputs': ['extract']}
+    }
+    with de.StageLogger(str(tmp_path / "log.jsonl")) as logger:
+        de.run_pipeline(stages, log = logger)
+    counts = {
+        r['stage']: (r.get('rows_in'), r.get('rows_out'))
+        for r in logger.records if r['event'] == 'stage'
+    }
+    assert counts == {'extract': (None, 3), 'filter': (3, 2)}
@@ -0,0 +1,39 @@
+import polars as pl
+import pytest
+
+from src import pyproj4de as de
+
+def day_stages(day, calls, fail = False):
+    def extract():
+        calls.append(day)
+        return pl.DataFrame({'day': [day]})
+
+    def load(df):
+        if fail:
+            raise RuntimeError("load failed")
+        return df.collect()
+
+    return {
+        'extract': {'func': extract, 'checkpoint': True},
+        'load': {'func': load, 'inputs': ['extract']}
+    }
+
+def test_finished_run_checkpoints_are_not_reused(tmp_path):
+    calls = []
+    out = de.run_pipeline(day_stages("monday", calls), checkpoint_dir = tmp_path)
+    assert out['load']['day'].to_list() == ["monday"]
+
+    out = de.run_pipeline(day_stages("tuesday", calls), checkpoint_dir = tmp_path)
+    assert out['load']['day'].to_list() == ["tuesday"]
+    assert calls == ["monday", "tuesday"]
+
+def test_failed_run_resumes_from_checkpoints(tmp_path):
+    calls = []
+    de.run_pipeline(day_stages("monday", calls), checkpoint_dir = tmp_path)
+    with pytest.raises(RuntimeError):
+        de.run_pipeline(day_stages("tuesday", calls, fail = True), checkpoint_dir = tmp_path)
+
+    # The rerun restores tuesday's extract rather than running it again
+    out = de.run_pipeline(day_stages("wednesday", calls), checkpoint_dir = tmp_path)
+    assert out['load']['day'].to_list() == ["tuesday"]
+    assert calls == ["monday", "tuesday"]
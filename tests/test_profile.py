@@ -0,0 +1,42 @@
+import os
+import sys
+import json
+import subprocess
+from pathlib import Path
+
+import polars as pl
+
+from src import pyproj4de as de
+
+root = Path(__file__).parent.parent
+
+def test_env_profile_wraps_every_public_function(tmp_path):
+    code = (
+        "import json\n"
+        "from src import pyproj4de as de\n"
+        "print(json.dumps([name for name, func in vars(de).items()\n"
+        "    if getattr(func, '__wrapped_by_profile__', False)]))\n"
+    )
+    env = {**os.environ, 'PYPROJ4DE_PROFILE': str(tmp_path / "profile.json")}
+    out = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd = root, env = env, capture_output = True, text = True, check = True
+    )
+    wrapped = set(json.loads(out.stdout.strip().splitlines()[-1]))
+    assert set(de._public_functions()) <= wrapped
+
+def test_plan_is_explained_once():
+    with de.profile() as prof:
+        for _ in range(3):
+            de.transform_type(pl.LazyFrame({'a': ['1']}), schema = {'a': pl.Int64})
+    report = prof.report()
+    assert report['functions']['transform_type']['calls'] == 3
+    assert 'transform_type' in report['plans']
+
+def test_only_module_qualified_calls_are_profiled(tmp_path):
+    (tmp_path / "a.csv").write_text("a\n1\n")
+    extract_data = de.extract_data
+    with de.profile() as prof:
+        de.extract_data(str(tmp_path))
+        extract_data(str(tmp_path))
+    assert prof.report()['functions']['extract_data']['calls'] == 1
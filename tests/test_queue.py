@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+from polars.testing import assert_frame_equal
+
+from src import pyproj4de as de
+
+def write_inputs(dir_path, bad = True):
+    (dir_path / "a.csv").write_text("name,height\njack,67.7\ntom,68.7\n")
+    (dir_path / "b.json").write_text('{"name": "ann", "height": 60.5}\n')
+    (dir_path / "c.xml").write_text(
+        "<data><p><name>joe</name><height>70.1</height></p></data>"
+    )
+    if bad:
+        (dir_path / "d.xml").write_text("<data><p><name>cut off")
+
+def test_run_workers_with_a_bad_file(tmp_path):
+    data_dir = tmp_path / "landing"
+    data_dir.mkdir()
+    write_inputs(data_dir)
+    queue = str(tmp_path / "queue.db")
+
+    assert de.enqueue_files(queue, str(data_dir)) == 4
+    # Enqueuing again adds nothing
+    assert de.enqueue_files(queue, str(data_dir)) == 0
+
+    counts = de.run_workers(
+        queue, de.extract_file, str(tmp_path / "shards"), workers = 2,
+        max_attempts = 2, backoff = 0, poll = 0.1
+    )
+    assert counts == {'done': 3, 'failed': 1, 'lost': 0}
+    assert de.queue_status(queue) == {'pending': 0, 'running': 0, 'done': 3, 'failed': 1}
+
+    with pytest.warns(UserWarning, match = "d.xml"):
+        serial = de.extract_data(data_dir, on_error = 'skip')
+    assert_frame_equal(de.merge_shards(queue).collect(), serial)
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    data_dir = tmp_path / "landing"
+    data_dir.mkdir()
+    write_inputs(data_dir, bad = False)
+    queue = str(tmp_path / "queue.db")
+    de.enqueue_files(queue, str(data_dir))
+
+    # A worker claims a job and dies: its lease has already run out
+    conn = de._queue_connect(queue)
+    file = de._claim_job(conn, "crashed", lease = -1, max_attempts = 3)
+    conn.close()
+    assert de.queue_status(queue)['running'] == 1
+
+    counts = de.run_worker(queue, de.extract_file, str(tmp_path / "shards"), poll = 0.1)
+    assert counts == {'done': 3, 'failed': 0, 'lost': 0}
+    with sqlite3.connect(queue) as conn:
+        status, attempts, worker = conn.execute(
+            "SELECT status, attempts, worker FROM jobs WHERE file = ?", (file,)
+        ).fetchone()
+    assert (status, attempts) == ('done', 2) and worker != "crashed"
+    assert de.merge_shards(queue).collect().height == 4
@@ -0,0 +1,74 @@
+import os
+import sqlite3
+
+import polars as pl
+import pytest
+
+from src import pyproj4de as de
+
+def rows(file, table):
+    with sqlite3.connect(file) as conn:
+        return conn.execute(f"SELECT * FROM {table} ORDER BY 1").fetchall()
+
+def test_load_sqlite_lazyframe_in_batches(tmp_path):
+    file = str(tmp_path / "test.db")
+    lf = pl.LazyFrame({'id': list(range(1000)), 'v': [float(i) for i in range(1000)]})
+    assert de.load_sqlite(file, 't', lf.filter(pl.col('id') % 2 == 0), batch_size = 64) == 500
+    assert len(rows(file, 't')) == 500
+
+def test_load_sqlite_replace_keeps_old_table_on_failure(tmp_path, monkeypatch):
+    file = str(tmp_path / "test.db")
+    de.load_sqlite(file, 't', pl.DataFrame({'id': [1, 2]}), mode = 'replace')
+
+    # The source fails after some batches have been committed
+    iter_batches = de._iter_batches
+    def failing(data, batch_size):
+        yield from iter_batches(data, 2)
+        raise RuntimeError("source failed")
+    monkeypatch.setattr(de, '_iter_batches', failing)
+
+    data = pl.DataFrame({'id': list(range(10))})
+    with pytest.raises(RuntimeError):
+        de.load_sqlite(file, 't', data, mode = 'replace')
+    assert rows(file, 't') == [(1,), (2,)]
+
+    monkeypatch.undo()
+    de.load_sqlite(file, 't', data, mode = 'replace', indexes = [['id']])
+    assert len(rows(file, 't')) == 10
+
+def test_query_sqlite_cache_hit_and_invalidation(tmp_path):
+    file = str(tmp_path / "test.db")
+    de.load_sqlite(file, 't', pl.DataFrame({'id': [1, 2, 3]}), mode = 'replace')
+    query = "SELECT id FROM t WHERE id >= ? ORDER BY id"
+
+    first = de.query_sqlite(file, query, [2])
+    assert first['id'].to_list() == [2, 3]
+    assert de.query_sqlite(file, query, [2]) is first
+    assert de.query_sqlite(file, query, [3])['id'].to_list() == [3]
+    named = de.query_sqlite(file, "SELECT id FROM t WHERE id < :max", {'max': 2})
+    assert named['id'].to_list() == [1]
+
+    # Any write to the database invalidates cached results
+    de.load_sqlite(file, 't', pl.DataFrame({'id': [4]}), mode = 'append')
+    assert de.query_sqlite(file, query, [2])['id'].to_list() == [2, 3, 4]
+
+def test_query_sqlite_database_recreated_at_same_path(tmp_path):
+    file = str(tmp_path / "test.db")
+    de.load_sqlite(file, 't', pl.DataFrame({'id': [1]}), mode = 'replace')
+    assert de.query_sqlite(file, "SELECT id FROM t")['id'].to_list() == [1]
+
+    os.remove(file)
+    de.load_sqlite(file, 't', pl.DataFrame({'id': [2, 3]}), mode = 'replace')
+    assert de.query_sqlite(file, "SELECT id FROM t ORDER BY id")['id'].to_list() == [2, 3]
+    assert de.query_sqlite(file, "SELECT id FROM t")['id'].to_list() == [2, 3]
+
+def test_query_sqlite_empty_result_types(tmp_path):
+    file = str(tmp_path / "test.db")
+    with sqlite3.connect(file) as conn:
+        conn.execute("CREATE TABLE t (id INTEGER, price REAL, name TEXT, amount DECIMAL(10, 2))")
+    empty = de.query_sqlite(file, "SELECT id, price, name, amount, id + 1 AS next FROM t")
+    assert empty.schema == pl.Schema({
+        'id': pl.Int64, 'price': pl.Float64, 'name': pl.String,
+        'amount': pl.Float64, 'next': pl.String
+    })
+    assert de.query_sqlite(file, "SELECT id FROM t WHERE id > ?", [0]).schema == pl.Schema({'id': pl.String})
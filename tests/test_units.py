@@ -0,0 +1,32 @@
+import polars as pl
+import pytest
+
+from src import pyproj4de as de
+
+def test_unit_factors_with_offset():
+    scale, offset = de.unit_factors('degC', 'degF')
+    assert scale == pytest.approx(1.8)
+    assert offset == pytest.approx(32.0)
+
+def test_transform_unit_celsius_to_fahrenheit():
+    df = pl.DataFrame({'temp': [0.0, 100.0, -40.0]})
+    for data in (df, df.lazy(), de.TransformPlan(units = {'temp': ('degC', 'degF')})):
+        if isinstance(data, de.TransformPlan):
+            out = data(df)
+        else:
+            out = de.transform_unit(data, conversions = {'temp': ('degC', 'degF')}).lazy().collect()
+        assert out['temp'].to_list() == pytest.approx([32.0, 212.0, -40.0])
+
+def test_transform_unit_per_row_units():
+    df = pl.DataFrame({
+        'temp': [0.0, 212.0, 273.15, 5.0],
+        'temp_unit': ['degC', 'degF', 'kelvin', None]
+    })
+    conversions = {'temp': (pl.col('temp_unit'), 'degC')}
+    for data in (df, df.lazy()):
+        out = de.transform_unit(data, conversions = conversions).lazy().collect()
+        # Row order and other columns are kept; a null unit gives null
+        assert out.columns == ['temp', 'temp_unit']
+        assert out['temp_unit'].to_list() == df['temp_unit'].to_list()
+        assert out['temp'].to_list()[:3] == pytest.approx([0.0, 100.0, 0.0])
+        assert out['temp'][3] is None
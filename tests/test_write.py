@@ -0,0 +1,47 @@
+import polars as pl
+
+from src import pyproj4de as de
+
+def test_write_data_sinks_lazyframe(tmp_path):
+    lf = pl.LazyFrame({'a': ['1', '2', 'x'], 'b': ['64', '72', '70']})
+    plan = de.TransformPlan(types = {'a': pl.Int64, 'b': pl.Float64}, units = {'b': ('inch', 'meter')})
+    for ext in ('csv', 'parquet', 'arrow'):
+        file = tmp_path / f"out.{ext}"
+        de.write_data(str(file), plan(lf))
+        out = {'csv': pl.read_csv, 'parquet': pl.read_parquet, 'arrow': pl.read_ipc}[ext](file)
+        assert out.height == 3
+        assert out['b'].round(4).to_list() == [1.6256, 1.8288, 1.778]
+
+def test_write_data_partitioned_lazyframe(tmp_path):
+    lf = pl.LazyFrame({'year': [2020, 2021, 2021], 'v': [1.0, 2.0, 3.0]})
+    de.write_data(str(tmp_path), lf, format = 'parquet', partition_by = ['year'])
+    out = pl.read_parquet(tmp_path / "year=2021" / "part-0.parquet")
+    assert out['v'].to_list() == [2.0, 3.0]
+
+def test_write_data_partitioned_lazyframe_single_pass(tmp_path):
+    scans = []
+    def source(batch):
+        scans.append(1)
+        return batch
+    lf = pl.LazyFrame({'k': ['a', 'b', 'c'], 'v': [1, 2, 3]}).map_batches(source)
+    de.write_data(str(tmp_path), lf, format = 'parquet', partition_by = ['k'])
+    assert len(scans) == 1
+    assert pl.read_parquet(tmp_path / "k=c")['v'].to_list() == [3]
+
+def test_write_data_partition_values_are_escaped(tmp_path):
+    df = pl.DataFrame({'k': ['a/b', 'c d', 'x=y%', None], 'v': [1, 2, 3, 4]})
+    for data in (df, df.lazy()):
+        out = tmp_path / type(data).__name__
+        de.write_data(str(out), data, format = 'parquet', partition_by = ['k'])
+        assert sorted(path.name for path in out.iterdir()) == [
+            'k=__HIVE_DEFAULT_PARTITION__', 'k=a%2Fb', 'k=c%20d', 'k=x%3Dy%25'
+        ]
+        assert pl.read_parquet(out / "k=a%2Fb")['v'].to_list() == [1]
+
+def test_write_data_append_lazyframe(tmp_path):
+    file = str(tmp_path / "out.csv")
+    de.write_data(file, pl.LazyFrame({'a': [1, 2]}), append = True)
+    de.write_data(file, pl.LazyFrame({'a': [3]}), append = True)
+    # Empty frames (no new files) append nothing
+    de.write_data(file, pl.LazyFrame(), append = True)
+    assert pl.read_csv(file)['a'].to_list() == [1, 2, 3]
@@ -0,0 +1,60 @@
+import gzip
+
+import pytest
+from polars.testing import assert_frame_equal
+
+from src import pyproj4de as de
+
+def write_xml(file, rows):
+    # Larger than one parse chunk, with nested elements, missing fields
+    # and a field whose tail text follows a nested element
+    records = "".join(
+        f"<row><id>{i}<meta><meta>x</meta></meta>tail</id>"
+        + (f"<v>{i * 0.5}</v>" if i % 7 else "")
+        + "<v>second</v><name></name></row>"
+        for i in range(rows)
+    )
+    data = f"<?xml version='1.0'?><data>{records}</data>".encode()
+    if file.endswith('.gz'):
+        data = gzip.compress(data)
+    with open(file, 'wb') as f:
+        f.write(data)
+
+def test_extract_xml_stream_matches_extract_xml(tmp_path):
+    for name in ("rows.xml", "rows.xml.gz"):
+        file = str(tmp_path / name)
+        write_xml(file, 5000)
+        assert_frame_equal(de.extract_xml_stream(file), de.extract_xml(file))
+        columns = ['v', 'missing', 'id']
+        assert_frame_equal(
+            de.extract_xml_stream(file, columns = columns, options = {'batch_size': 333}),
+            de.extract_xml(file, columns = columns)
+        )
+
+def test_iter_xml_batches(tmp_path):
+    file = str(tmp_path / "rows.xml")
+    write_xml(file, 1000)
+    batches = list(de.iter_xml(file, options = {'batch_size': 300}))
+    assert [batch.height for batch in batches] == [300, 300, 300, 100]
+    assert batches[-1]['id'][-1] == "999"
+
+def test_extract_data_workers_matches_serial(tmp_path):
+    for n in range(3):
+        write_xml(str(tmp_path / f"part{n}.xml"), 100 * (n + 1))
+    assert_frame_equal(de.extract_data(tmp_path, workers = 2), de.extract_data(tmp_path))
+
+def test_parse_encoding_is_honoured(tmp_path):
+    # Latin-1 bytes with no declaration: not valid as the default UTF-8
+    (tmp_path / "a.xml").write_bytes(
+        "<data><r><name>Zoë</name><city>Malmö</city></r></data>".encode('latin-1')
+    )
+    options = {'parse': {'encoding': 'latin-1'}}
+    file = str(tmp_path / "a.xml")
+    for reader in (de.extract_xml, de.extract_xml_stream):
+        assert reader(file, options = options).row(0) == ("Zoë", "Malmö")
+    for kwargs in ({'lazy': True}, {'workers': 2}, {'harmonize': True}):
+        df = de.extract_data(tmp_path, options = {'xml': options}, **kwargs)
+        assert df.lazy().collect().row(0) == ("Zoë", "Malmö")
+
+    with pytest.raises(ValueError, match = "encodnig"):
+        de.extract_xml_stream(file, options = {'parse': {'encodnig': 'latin-1'}})